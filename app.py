@@ -1,20 +1,69 @@
 # app.py (Final Polished Version)
-from flask import Flask, request, jsonify, render_template, session
-import requests
+from flask import Flask, Response, request, jsonify, render_template, session
+import hashlib
+import json
 import os
 import time
 import re
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from score_logic import (
     get_dynamic_token, login, fetch_all_grades, get_user_name,
     fetch_academic_info, save_credentials, load_credentials,
-    get_hashed_password_for_storage
+    get_hashed_password_for_storage, check_session_alive, fetch_grades, iter_course_lists
 )
+from grades_cache import GradesCache
+from grades_diff import VersionHistory, stamp_versions, build_diff, course_keys
+from grade_analytics import CourseTable, summarize, format_gpa
+import ocr_engine
+from upstream_pool import UpstreamSessionPool, create_upstream_session
+from retry_policy import Deadline, LOGIN_BUDGET
 from datetime import timedelta
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
 app.permanent_session_lifetime = timedelta(minutes=30)
 
+# --- 并发抓取配置 ---
+# 开启后 get_full_data 会同时发起相互独立的上游请求，总耗时约等于最慢的一次调用
+CONCURRENT_FETCH = os.environ.get("GRADES_CONCURRENT_FETCH", "1") != "0"
+FULL_DATA_DEADLINE = float(os.environ.get("GRADES_FULL_DATA_DEADLINE", "25"))  # 整体截止时间（秒）
+_fetch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("GRADES_FETCH_WORKERS", "16")), thread_name_prefix="upstream-fetch")
+# 学业信息不在关键路径上且重试可能持续 ACADEMIC_INFO_BUDGET 秒，单独一个线程池，慢的时候不会挤占姓名和成绩请求
+_academic_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("GRADES_ACADEMIC_WORKERS", "8")), thread_name_prefix="upstream-academic")
+
+# --- 成绩缓存（按学号） ---
+grades_cache = GradesCache()
+version_history = VersionHistory()
+
+# --- 上游会话池（按 Flask 会话复用连接） ---
+upstream_pool = UpstreamSessionPool()
+
+def get_upstream_session():
+    if 'upstream_sid' not in session: session['upstream_sid'] = uuid.uuid4().hex
+    return upstream_pool.acquire(session['upstream_sid'], session.get('cookies'))
+
+# --- 静态资源版本号：内容变化时 service worker 会重新预缓存 ---
+def compute_static_version():
+    digest = hashlib.sha1()
+    for filename in ("style.css", "script.js", "manifest.json", "service-worker.js"):
+        with open(os.path.join(app.static_folder, filename), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+STATIC_VERSION = compute_static_version()
+
+@app.context_processor
+def inject_static_version():
+    return {"static_version": STATIC_VERSION}
+
+# --- 验证码识别引擎预热 ---
+# 导入时只在当前进程加载模型；识别进程池默认不在导入时启动（python app.py、压测脚本都在进程内识别），
+# gunicorn 下由 gunicorn.conf.py 在 fork 后启动，也可设置 OCR_START_POOL_ON_IMPORT=1 强制启动
+if os.environ.get("OCR_WARM_START", "1") != "0":
+    ocr_engine.warm_up(start_pool_now=os.environ.get("OCR_START_POOL_ON_IMPORT", "0") != "0")
+
 # --- 数据处理辅助函数 ---
 def process_single_course_list(raw_course_list):
     processed_list = []
@@ -42,7 +91,8 @@ def process_single_course_list(raw_course_list):
     return processed_list
 
 def process_grades_data(raw_grades_data):
-    if not raw_grades_data or not isinstance(raw_grades_data, dict) or 'lnList' not in raw_grades_data: return []
+    """按学期分组处理后的课程，返回 (学期列表, 列式课程表)；课程表只在这里建一次，之后的统计都直接在列上计算"""
+    if not raw_grades_data or not isinstance(raw_grades_data, dict) or 'lnList' not in raw_grades_data: return [], CourseTable()
     all_courses = []
     for course_group in raw_grades_data.get('lnList', []):
         all_courses.extend(process_single_course_list(course_group.get('cjList', [])))
@@ -51,7 +101,8 @@ def process_grades_data(raw_grades_data):
         term_name = course.pop('termDisplayName')
         if term_name not in grouped_by_term: grouped_by_term[term_name] = []
         grouped_by_term[term_name].append(course)
-    return [{'termName': name, 'list': courses} for name, courses in grouped_by_term.items()]
+    terms = [{'termName': name, 'list': courses} for name, courses in grouped_by_term.items()]
+    return terms, CourseTable.from_terms(terms)
 
 def get_sort_key(term_name):
     match = re.search(r'(\d{4})-\d{4}', term_name)
@@ -76,28 +127,90 @@ def add_academic_labels(sorted_grades):
         if season_char: term_data['termLabel'] = f"大{year_char}{season_char}"
     return sorted_grades
 
-# [MODIFIED] 状态计算函数，现在接收 academic_info
-def calculate_current_term_stats(current_term_grades, academic_info):
+def order_and_label_terms(terms):
+    """按学年学期排序、添加“大X上/下”标签，并把最新学期放在最前面标记为当前学期"""
+    for term_data in terms:
+        term_data.pop('isCurrent', None)
+        term_data.pop('termLabel', None)
+    terms.sort(key=lambda x: get_sort_key(x['termName']))
+    labeled_grades = add_academic_labels(terms)
+    labeled_grades.reverse() # 最新的在前
+    if labeled_grades:
+        labeled_grades[0]['isCurrent'] = True # [NEW] 为当前学期添加标志
+    return labeled_grades
+
+def merge_current_term(previous, raw_current_grades):
+    """把当前学期接口的结果合并进上次返回的完整历史，返回新的数据（不修改 previous）"""
+    current_courses = []
+    for _, course_list in iter_course_lists(raw_current_grades):
+        current_courses.extend(process_single_course_list(course_list))
+    if not current_courses: return None
+    terms = [dict(term, list=list(term['list'])) for term in previous['all_grades']]
+    known_names = {term['termName'] for term in terms}
+    term_names = {course.pop('termDisplayName') for course in current_courses}
+    term_name = term_names.pop() if len(term_names) == 1 else None
+    # 当前学期接口返回了一个尚未出现过的学期（新学期开始），将其作为新学期加入；否则更新对应学期
+    if term_name and term_name not in known_names and re.search(r'\d{4}-\d{4}', term_name):
+        terms.append({'termName': term_name, 'list': current_courses})
+    else:
+        target = next((term for term in terms if term['termName'] == term_name), None) if term_name else None
+        target = target or next((term for term in terms if term.get('isCurrent')), terms[0] if terms else None)
+        if target is None: return None
+        # 与增量接口相同的课程标识，同名课程按出现顺序区分，避免两门同名课程写进同一个位置
+        positions = {key: index for index, key in enumerate(course_keys(target['list']))}
+        for key, course in zip(course_keys(current_courses), current_courses):
+            index = positions.get(key)
+            if index is None: target['list'].append(course)
+            else: target['list'][index] = course
+    labeled_grades = order_and_label_terms(terms)
+    term_summaries, overall_summary = annotate_terms(labeled_grades, CourseTable.from_terms(labeled_grades))
+    academic_info = {"gpa": previous.get("official_gpa", "N/A"), "course_count": previous.get("course_count", 0)}
+    current_term_stats = calculate_current_term_stats(labeled_grades[:1], academic_info, term_summaries[labeled_grades[0]['termName']])
+    return stamp_versions(dict(previous, all_grades=labeled_grades, current_stats=current_term_stats, **analytics_fields(overall_summary, academic_info)))
+
+def annotate_terms(labeled_grades, table):
+    """用列式课程表在本地计算各学期与累计的绩点、学分，并写入每个学期"""
+    term_summaries, overall_summary = summarize(table)
+    for term_data in labeled_grades:
+        summary = term_summaries[term_data['termName']]
+        term_data['gpa'] = format_gpa(summary['gpa'])
+        term_data['creditsEarned'] = summary['credits_earned']
+    return term_summaries, overall_summary
+
+def academic_fields(academic_info, local_gpa):
+    """官方 GPA 和本地计算的 GPA 分开返回；overall_gpa 是页面展示的那个，gpa_source 标明其来源。
+
+    没有取得学业信息（官方 GPA 为 N/A）时数据标记为 provisional：页面展示本地 GPA 并注明，
+    成绩缓存只短暂保留，学业信息到达后再替换。
+    """
+    official_gpa = academic_info.get("gpa", "N/A") if academic_info else "N/A"
+    has_official = official_gpa != "N/A"
+    return {
+        "official_gpa": official_gpa, "course_count": academic_info.get("course_count", 0) if academic_info else 0,
+        "local_gpa": local_gpa, "overall_gpa": official_gpa if has_official else local_gpa,
+        "gpa_source": "official" if has_official else "local", "provisional": not has_official,
+    }
+
+def analytics_fields(overall_summary, academic_info):
+    return {
+        **academic_fields(academic_info, format_gpa(overall_summary['gpa'])),
+        "credit_summary": {key: overall_summary[key] for key in ("passed", "failed", "credits_attempted", "credits_earned")},
+    }
+
+# [MODIFIED] 状态计算函数，现在接收 academic_info；current_summary 为当前学期的统计（含 passed / announced）
+def calculate_current_term_stats(current_term_grades, academic_info, current_summary):
     stats = {"passed": 0, "announced": 0, "total": 0}
     if academic_info:
         stats["total"] = academic_info.get("course_count", 0)
 
     if not current_term_grades or not current_term_grades[0]['list']:
         return stats
-    
-    current_courses = current_term_grades[0]['list']
-    passed_count = 0
-    announced_count = 0
-    for course in current_courses:
-        if course['isValidScore']:
-            announced_count += 1
-            if float(course['courseScore']) >= 60:
-                passed_count += 1
-    stats["passed"] = passed_count
-    stats["announced"] = announced_count
+
+    stats["passed"] = current_summary["passed"]
+    stats["announced"] = current_summary["announced"]
     # 如果 academic_info 中没有课程总数，则使用当前学期已公布的课程数作为总数
     if stats["total"] == 0:
-        stats["total"] = len(current_courses)
+        stats["total"] = len(current_term_grades[0]['list'])
     return stats
 
 # --- 路由 ---
@@ -105,69 +218,321 @@ def calculate_current_term_stats(current_term_grades, academic_info):
 def index():
     return render_template('index.html')
 
-def get_full_data(s):
-    user_name = get_user_name(s)
-    academic_info = fetch_academic_info(s) # 获取学业信息
-    raw_all_grades = fetch_all_grades(s)
-    all_grades_by_term = process_grades_data(raw_all_grades)
+@app.route('/service-worker.js')
+def service_worker():
+    # 从根路径提供 service worker，使其作用域覆盖页面和 /api；脚本中的版本占位符替换为当前静态资源版本
+    with open(os.path.join(app.static_folder, 'service-worker.js'), encoding='utf-8') as f:
+        script = f.read().replace('__STATIC_VERSION__', STATIC_VERSION)
+    response = Response(script, mimetype='application/javascript')
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+UPSTREAM_DEFAULTS = {"user_name": "同学", "academic_info": {"gpa": "N/A", "course_count": 0}, "raw_all_grades": None}
+
+def submit_upstream_fetches(s):
+    return {
+        "user_name": _fetch_executor.submit(get_user_name, s),
+        "academic_info": _academic_executor.submit(fetch_academic_info, s),
+        "raw_all_grades": _fetch_executor.submit(fetch_all_grades, s),
+    }
+
+def wait_upstream_result(futures, key, timeout):
+    """等待单个上游请求的结果；超时或出错时返回默认值（仍在排队的请求会被取消）"""
+    try:
+        return futures[key].result(timeout=timeout)
+    except Exception:
+        futures[key].cancel()
+        return UPSTREAM_DEFAULTS[key]
+
+def fetch_upstream_concurrently(s, deadline=None, futures=None):
+    """同时发起姓名、学业信息和历史成绩三个上游请求，在统一截止时间内汇总结果。
+
+    GPA 和学分已能在本地由成绩计算，只等待姓名和成绩；学业信息若届时尚未返回则不再等待，
+    已经开始的请求会在后台继续完成并缓存在上游会话上，供后续请求复用，还在排队的直接取消。
+    """
+    deadline = FULL_DATA_DEADLINE if deadline is None else deadline
+    futures = futures or submit_upstream_fetches(s)
+    done, not_done = wait([futures["user_name"], futures["raw_all_grades"]], timeout=deadline)
+    if not_done:
+        print(f"[{time.strftime('%H:%M:%S')}] 并发抓取超过 {deadline} 秒截止时间，{len(not_done)} 个请求未完成。")
+    if futures["academic_info"].done():
+        academic_info = wait_upstream_result(futures, "academic_info", 0)
+    else:
+        futures["academic_info"].cancel()  # 已在运行时取消不生效
+        academic_info = UPSTREAM_DEFAULTS["academic_info"]
+    return wait_upstream_result(futures, "user_name", 0), academic_info, wait_upstream_result(futures, "raw_all_grades", 0)
+
+def build_full_data(user_name, academic_info, raw_all_grades):
+    all_grades_by_term, course_table = process_grades_data(raw_all_grades)
     
     if not all_grades_by_term: return {"success": False}
 
-    all_grades_by_term.sort(key=lambda x: get_sort_key(x['termName']))
-    labeled_grades = add_academic_labels(all_grades_by_term)
-    labeled_grades.reverse() # 最新的在前
-    
-    if labeled_grades:
-        labeled_grades[0]['isCurrent'] = True # [NEW] 为当前学期添加标志
+    labeled_grades = order_and_label_terms(all_grades_by_term)
+    term_summaries, overall_summary = annotate_terms(labeled_grades, course_table)
 
     current_term_grades = [labeled_grades[0]] if labeled_grades else []
-    current_term_stats = calculate_current_term_stats(current_term_grades, academic_info)
+    current_term_stats = calculate_current_term_stats(current_term_grades, academic_info, term_summaries[labeled_grades[0]['termName']])
 
-    return {
+    return stamp_versions({
         "success": True, "all_grades": labeled_grades, "user_name": user_name,
-        "overall_gpa": academic_info.get("gpa", "N/A"), "current_stats": current_term_stats,
-    }
+        "current_stats": current_term_stats, **analytics_fields(overall_summary, academic_info),
+    })
+
+def apply_academic_info(full_data, academic_info):
+    """学业信息晚于成绩到达时，只更新官方 GPA、课程总数和版本号；本地统计不受影响，沿用已有结果"""
+    return stamp_versions(dict(
+        full_data, current_stats=calculate_current_term_stats(full_data["all_grades"][:1], academic_info, full_data["current_stats"]),
+        **academic_fields(academic_info, full_data["local_gpa"]),
+    ))
+
+def restamp_cached_grades(student_id, provisional, academic_future):
+    """学业信息在成绩返回之后才到达时，用带官方 GPA 的数据替换缓存中的临时结果"""
+    if academic_future.cancelled() or academic_future.exception() is not None: return
+    academic_info = academic_future.result()
+    if academic_info.get("gpa", "N/A") == "N/A": return
+    if grades_cache.replace(student_id, provisional, apply_academic_info(provisional, academic_info)):
+        print(f"[{time.strftime('%H:%M:%S')}] 学业信息已到达，已更新 {student_id} 的成绩缓存。")
+
+def get_full_data(s, student_id=None):
+    if CONCURRENT_FETCH:
+        futures = submit_upstream_fetches(s)
+        user_name, academic_info, raw_all_grades = fetch_upstream_concurrently(s, futures=futures)
+    else:
+        user_name = get_user_name(s)
+        academic_info = fetch_academic_info(s) # 获取学业信息
+        raw_all_grades = fetch_all_grades(s)
+    full_data = build_full_data(user_name, academic_info, raw_all_grades)
+    if CONCURRENT_FETCH and student_id is not None and full_data.get("provisional"):
+        futures["academic_info"].add_done_callback(lambda future: restamp_cached_grades(student_id, full_data, future))
+    return full_data
 
 # ... (文件余下部分，所有路由函数，都保持原样，无需修改) ...
+def grades_response(student_id, full_data, username):
+    """成绩接口的统一响应：带 ETag，支持 If-None-Match 返回 304，以及 since=<版本号> 的增量模式"""
+    version = full_data["version"]
+    version_history.remember(student_id, full_data)
+    if request.if_none_match.contains(version):
+        response = app.response_class(status=304)
+    else:
+        since = request.args.get('since')
+        base_fingerprints = version_history.lookup(student_id, since) if since else None
+        body = build_diff(full_data, base_fingerprints, since) if base_fingerprints is not None else dict(full_data)
+        body["username"] = username
+        response = jsonify(body)
+    response.set_etag(version)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def load_full_data(s, student_id=None):
+    if not check_session_alive(s): return {"success": False}
+    return get_full_data(s, student_id)
+
 @app.route('/api/auto_login_and_grades', methods=['POST'])
 def api_auto_login_and_grades():
-    s = requests.Session()
     username_saved, _ = load_credentials()
-    if 'cookies' in session: s.cookies.update(session['cookies'])
-    user_name_check = get_user_name(s)
-    if user_name_check != "同学":
-        full_data = get_full_data(s)
+    if 'cookies' in session:
+        s = get_upstream_session()
+        student_id = session.get('username')
+        full_data, cache_status = grades_cache.get_or_load(student_id, lambda: load_full_data(s, student_id))
         if full_data["success"]:
-            full_data["username"] = username_saved
-            return jsonify(full_data), 200
+            if cache_status == "miss": session['cookies'] = s.cookies.get_dict()
+            response = grades_response(session.get('username'), full_data, username_saved)
+            response.headers["X-Grades-Cache"] = cache_status
+            return response
+    message = "会话已过期，请手动登录。" if username_saved else "请登录。"
+    return jsonify({"success": False, "message": message, "username_saved": username_saved}), 401
+
+# --- 流式接口（NDJSON）：姓名、统计、各学期依次推送，前端逐块渲染 ---
+def stats_event(full_data):
+    return {"type": "stats", **{key: full_data.get(key) for key in ("current_stats", "overall_gpa", "gpa_source", "official_gpa", "local_gpa")}}
+
+def iter_payload_events(full_data, username):
+    yield {"type": "user", "user_name": full_data["user_name"], "username": username}
+    yield stats_event(full_data)
+    for index, term in enumerate(full_data["all_grades"]):
+        yield {"type": "term", "index": index, "term": term}
+    yield {"type": "done", "version": full_data["version"]}
+
+def iter_full_data_events(s, student_id, username):
+    """边抓取边推送：姓名一到就发送，成绩到达后发送统计和各学期，学业信息较慢时随后补发统计"""
+    deadline_at = time.monotonic() + FULL_DATA_DEADLINE
+    remaining = lambda: max(0.0, deadline_at - time.monotonic())
+    futures = submit_upstream_fetches(s)
+    user_name = wait_upstream_result(futures, "user_name", remaining())
+    yield {"type": "user", "user_name": user_name, "username": username}
+    raw_all_grades = wait_upstream_result(futures, "raw_all_grades", remaining())
+    academic_ready = futures["academic_info"].done()
+    academic_info = wait_upstream_result(futures, "academic_info", 0) if academic_ready else UPSTREAM_DEFAULTS["academic_info"]
+    full_data = build_full_data(user_name, academic_info, raw_all_grades)
+    if not full_data["success"]:
+        yield {"type": "error", "message": "获取成绩失败，请稍后重试。"}
+        return
+    yield stats_event(full_data)
+    for index, term in enumerate(full_data["all_grades"]):
+        yield {"type": "term", "index": index, "term": term}
+    if not academic_ready:
+        academic_info = wait_upstream_result(futures, "academic_info", remaining())
+        full_data = apply_academic_info(full_data, academic_info)
+        yield stats_event(full_data)
+    grades_cache.set(student_id, full_data)
+    version_history.remember(student_id, full_data)
+    yield {"type": "done", "version": full_data["version"]}
+
+def ndjson_response(events):
+    def generate():
+        for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    response = Response(generate(), mimetype="application/x-ndjson")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # 关闭反向代理缓冲，保证逐行送达
+    return response
+
+@app.route('/api/stream/auto_login_and_grades', methods=['POST'])
+def api_stream_auto_login_and_grades():
+    username_saved, _ = load_credentials()
+    if 'cookies' in session:
+        student_id = session.get('username')
+        s = get_upstream_session()
+        cached, cache_status = grades_cache.get(student_id)
+        if cached is not None:
+            if cache_status == "stale": grades_cache.refresh_in_background(student_id, lambda: load_full_data(s, student_id))
+            # 客户端已持有某个版本时按 JSON 接口返回 304 或增量，不再逐学期重发全部历史
+            if request.if_none_match or request.args.get('since'): return grades_response(student_id, cached, username_saved)
+            return ndjson_response(iter_payload_events(cached, username_saved))
+        if check_session_alive(s):
+            session['cookies'] = s.cookies.get_dict()
+            return ndjson_response(iter_full_data_events(s, student_id, username_saved))
     message = "会话已过期，请手动登录。" if username_saved else "请登录。"
     return jsonify({"success": False, "message": message, "username_saved": username_saved}), 401
 
+@app.route('/api/refresh_current_term', methods=['POST'])
+def api_refresh_current_term():
+    """只抓取体积小得多的当前学期接口，合并进上次返回的历史成绩后重新计算本学期统计"""
+    if 'cookies' not in session: return jsonify({"success": False, "message": "请登录。"}), 401
+    student_id = session.get('username')
+    s = get_upstream_session()
+    previous, _ = grades_cache.get(student_id)
+    if previous is None:
+        # 没有可供合并的历史数据时，退回到完整抓取
+        full_data = load_full_data(s, student_id)
+    else:
+        raw_current_grades = fetch_grades(s)
+        if raw_current_grades is None and not check_session_alive(s): full_data = {"success": False}
+        elif raw_current_grades is None: return jsonify({"success": False, "message": "刷新失败，请稍后重试。"}), 502
+        else: full_data = merge_current_term(previous, raw_current_grades) or previous
+    if not full_data["success"]:
+        grades_cache.invalidate(student_id)
+        return jsonify({"success": False, "message": "会话已过期，请手动登录。"}), 401
+    grades_cache.set(student_id, full_data)
+    return grades_response(student_id, full_data, student_id)
+
+# --- 登录流程（同步接口与异步登录任务共用） ---
+def run_login_pipeline(username, password_raw, deadline=None):
+    """执行获取Token、登录、抓取成绩的完整流程，返回 (上游会话, 结果, HTTP状态码)"""
+    s = create_upstream_session()
+    dynamic_token = get_dynamic_token(s)
+    if not dynamic_token: return s, {"success": False, "message": "获取Token失败，请重试。"}, 401
+    if not login(s, username, password_raw, dynamic_token, deadline=deadline):
+        return s, {"success": False, "message": "登录失败，请检查学号、密码或验证码。"}, 401
+    if deadline is not None and deadline.cancelled(): return s, {"success": False, "message": "登录任务已取消。"}, 409
+    full_data = get_full_data(s, username)
+    if not full_data["success"]: return s, {"success": False, "message": "登录成功，但获取成绩失败。"}, 401
+    return s, full_data, 200
+
+def complete_login(s, username, full_data, save_info, hashed_password_for_storage):
+    """在请求上下文中把登录结果写入 Flask 会话、上游会话池和成绩缓存"""
+    session['cookies'] = s.cookies.get_dict()
+    session['username'] = username
+    upstream_pool.discard(session.get('upstream_sid'))
+    session['upstream_sid'] = uuid.uuid4().hex
+    upstream_pool.register(session['upstream_sid'], s)
+    session.permanent = True
+    grades_cache.set(username, full_data)
+    if save_info:
+        save_credentials(username, hashed_password_for_storage)
+    else:
+        credentials_file_path = os.path.join(os.path.dirname(__file__), "user_credentials.json")
+        if os.path.exists(credentials_file_path): os.remove(credentials_file_path)
+    full_data = dict(full_data)
+    full_data["username"] = username
+    return full_data
+
 @app.route('/api/manual_login_and_get_grades', methods=['POST'])
 def api_manual_login_and_get_grades():
     data = request.get_json()
     username, password_raw = data.get('username'), data.get('password')
     if not all([username, password_raw]): return jsonify({"success": False, "message": "缺少学号或密码。"}), 400
-    s = requests.Session()
-    dynamic_token = get_dynamic_token(s)
-    if not dynamic_token: return jsonify({"success": False, "message": "获取Token失败，请重试。"}), 401
-    if login(s, username, password_raw, dynamic_token):
-        full_data = get_full_data(s)
-        if full_data["success"]:
-            session['cookies'] = s.cookies.get_dict()
-            session.permanent = True
-            if data.get('save_info', False):
-                save_credentials(username, get_hashed_password_for_storage(password_raw))
-            else:
-                credentials_file_path = os.path.join(os.path.dirname(__file__), "user_credentials.json")
-                if os.path.exists(credentials_file_path): os.remove(credentials_file_path)
-            full_data["username"] = username
-            return jsonify(full_data), 200
-        else: return jsonify({"success": False, "message": "登录成功，但获取成绩失败。"}), 401
-    else: return jsonify({"success": False, "message": "登录失败，请检查学号、密码或验证码。"}), 401
+    s, result, status = run_login_pipeline(username, password_raw)
+    if status != 200: return jsonify(result), status
+    full_data = complete_login(s, username, result, data.get('save_info', False), get_hashed_password_for_storage(password_raw))
+    return jsonify(full_data), 200
+
+# --- 异步登录任务 ---
+# 登录中的验证码重试和退避等待在后台线程中进行，请求线程立即返回，前端轮询任务状态；
+# 退避等待会占住线程，线程数默认与 gunicorn 的 gthread 线程数一致，高峰时登录不至于排队
+LOGIN_JOB_TTL = 300
+_login_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("GRADES_LOGIN_WORKERS", "32")), thread_name_prefix="login-job")
+_login_jobs = {}
+_login_jobs_lock = threading.Lock()
+
+def _purge_login_jobs_locked():
+    now = time.monotonic()
+    for job_id in [job_id for job_id, job in _login_jobs.items() if now - job["created_at"] > LOGIN_JOB_TTL]:
+        _cancel_login_job_locked(job_id)
+
+def _cancel_login_job_locked(job_id):
+    """取消排队中的任务；已在执行的任务在下一次退避等待时停止重试"""
+    job = _login_jobs.pop(job_id, None)
+    if job is None: return
+    job["future"].cancel()
+    job["deadline"].cancel()
+
+@app.route('/api/login_jobs', methods=['POST'])
+def api_create_login_job():
+    data = request.get_json() or {}
+    username, password_raw = data.get('username'), data.get('password')
+    if not all([username, password_raw]): return jsonify({"success": False, "message": "缺少学号或密码。"}), 400
+    job_id = uuid.uuid4().hex
+    deadline = Deadline(LOGIN_BUDGET)
+    job = {
+        "created_at": time.monotonic(), "username": username, "save_info": data.get('save_info', False),
+        "hashed_password_for_storage": get_hashed_password_for_storage(password_raw), "deadline": deadline,
+        "future": _login_executor.submit(run_login_pipeline, username, password_raw, deadline),
+    }
+    with _login_jobs_lock:
+        _purge_login_jobs_locked()
+        # 同一浏览器会话重新提交登录时，之前的任务不再需要
+        if session.get('login_job'): _cancel_login_job_locked(session['login_job'])
+        _login_jobs[job_id] = job
+    session['login_job'] = job_id
+    return jsonify({"success": True, "status": "pending", "job_id": job_id}), 202
+
+@app.route('/api/login_jobs/<job_id>', methods=['GET'])
+def api_login_job_status(job_id):
+    with _login_jobs_lock:
+        job = _login_jobs.get(job_id) if session.get('login_job') == job_id else None
+        if job is not None and job["future"].done(): _login_jobs.pop(job_id, None)
+    if job is None: return jsonify({"success": False, "message": "登录任务不存在或已过期，请重新登录。"}), 404
+    if not job["future"].done(): return jsonify({"success": True, "status": "pending"}), 202
+    session.pop('login_job', None)
+    try:
+        s, result, status = job["future"].result()
+    except Exception as e:
+        print(f"[{time.strftime('%H:%M:%S')}] 登录任务执行失败: {e}")
+        return jsonify({"success": False, "message": "登录过程中发生错误，请重试。"}), 500
+    if status != 200: return jsonify(result), status
+    full_data = complete_login(s, job["username"], result, job["save_info"], job["hashed_password_for_storage"])
+    return jsonify(full_data), 200
+
+@app.route('/api/ocr_stats', methods=['GET'])
+def api_ocr_stats():
+    return jsonify(ocr_engine.get_stats()), 200
 
 @app.route('/api/logout', methods=['POST'])
 def api_logout():
+    grades_cache.invalidate(session.get('username'))
+    version_history.forget(session.get('username'))
+    upstream_pool.discard(session.get('upstream_sid'))
     session.clear()
     credentials_file_path = os.path.join(os.path.dirname(__file__), "user_credentials.json")
     if os.path.exists(credentials_file_path):
@@ -0,0 +1,49 @@
+# benchmarks/bench_html_extract.py
+"""对比各页面提取器在保存的登录页/首页上的耗时。
+
+用法: python benchmarks/bench_html_extract.py [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import html_extract
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+
+def load_page(name):
+    with open(os.path.join(PAGES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def bench(extractors, page, repeat):
+    results = {}
+    for extractor in extractors:
+        value = extractor(page)
+        seconds = min(timeit.repeat(lambda: extractor(page), number=repeat, repeat=3)) / repeat
+        results[extractor.__name__] = (seconds, value)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    login_page, index_page = load_page("login.html"), load_page("index.html")
+    token_results = bench(html_extract.TOKEN_EXTRACTORS, login_page, args.repeat)
+    name_results = bench(html_extract.USER_INFO_EXTRACTORS, index_page, args.repeat)
+
+    print(f"{'提取器':<20}{'页面':<12}{'每次耗时(µs)':>14}  结果")
+    for page_name, results in (("login.html", token_results), ("index.html", name_results)):
+        for name, (seconds, value) in results.items():
+            print(f"{name:<20}{page_name:<12}{seconds * 1e6:>14.1f}  {value!r}")
+
+    # 一次登录至少解析一次登录页（Token）和一次首页（姓名）
+    soup_cost = token_results["_token_soup"][0] + name_results["_user_info_soup"][0]
+    fast_cost = token_results["_token_regex"][0] + name_results["_user_info_regex"][0]
+    print(f"\n每次登录 CPU 耗时: BeautifulSoup {soup_cost * 1e3:.3f} ms -> 快速提取 {fast_cost * 1e3:.3f} ms，"
+          f"节省 {(soup_cost - fast_cost) * 1e3:.3f} ms（{soup_cost / fast_cost:.0f}x）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# benchmarks/fake_jwxs.py
+"""本地模拟的教务系统（jwxs），用于在不访问真实上游的情况下压测登录和成绩抓取。
+
+提供 score_logic 用到的全部接口：登录页（tokenValue）、验证码图片、j_spring_security_check、
+首页、academicInfo，以及带动态路径段的 scoreQuery 页面和数据接口。每个请求的延迟和失败率可配置，
+成绩数据按学号确定性生成。把 JWXS_BASE_URL 指向本服务即可让 app.py / poller.py 使用它。
+
+用法: python benchmarks/fake_jwxs.py [--port 8081] [--latency 0.05] [--jitter 0.02] [--failure-rate 0.0]
+      JWXS_BASE_URL=http://127.0.0.1:8081 python app.py
+"""
+import argparse
+import io
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, abort, g, jsonify, redirect, request
+from PIL import Image, ImageDraw
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages")
+SESSION_COOKIE = "JSESSIONID"
+CAPTCHA_CHARS = "abcdefghjkmnpqrstuvwxyz23456789"
+SCORE_QUERY_PREFIX = "/student/integratedQuery/scoreQuery"
+SCORE_QUERY_PAGES = {"coursePropertyScores": "coursePropertyScores/callback", "thisTermScores": "thisTermScores/data"}
+COURSE_NAMES = ["高等数学", "线性代数", "大学英语", "程序设计基础", "数据结构", "大学物理", "概率论与数理统计",
+                "计算机网络", "操作系统", "数据库原理", "体育", "思想道德与法治", "电路分析", "软件工程"]
+
+def load_page(name):
+    with open(os.path.join(PAGES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def render_captcha(code):
+    image = Image.new("RGB", (90, 34), "white")
+    ImageDraw.Draw(image).text((12, 10), code, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+# --- 按学号确定性生成成绩数据 ---
+def generate_courses(username, terms, courses_per_term, first_year=2021):
+    rng = random.Random(username)
+    courses = []
+    for term_number in range(terms):
+        start_year = first_year + term_number // 2
+        is_current = term_number == terms - 1
+        for course_number in range(courses_per_term):
+            credit = rng.choice([1.0, 2.0, 3.0, 4.0])
+            score = rng.randint(45, 99)
+            announced = not is_current or rng.random() < 0.6
+            courses.append({
+                "courseName": f"{rng.choice(COURSE_NAMES)}{course_number + 1}", "credit": f"{credit:.1f}",
+                "courseScore": str(score) if announced else None,
+                "gradePointScore": f"{max(0.0, (score - 50) / 10):.1f}" if announced else None,
+                "gradeName": ("合格" if score >= 60 else "不合格") if announced else None, "examTypeCode": rng.choice(["01", "02"]),
+                "operatingTime": f"{start_year + 1}0115093000", "academicYearCode": f"{start_year}-{start_year + 1}",
+                "termName": "秋" if term_number % 2 == 0 else "春",
+            })
+    return courses
+
+def create_app(latency=0.05, jitter=0.02, failure_rate=0.0, captcha_error_rate=0.0, terms=8, courses_per_term=8):
+    app = Flask(__name__)
+    login_page = load_page("login.html")
+    index_page = load_page("index.html")
+    captcha_codes = ["".join(random.choices(CAPTCHA_CHARS, k=4)) for _ in range(16)]
+    captcha_images = [render_captcha(code) for code in captcha_codes]
+    sessions = {}  # JSESSIONID -> {"token", "username", "segments"}
+    sessions_lock = threading.Lock()
+    grades_by_user = {}
+    stats = {"requests": 0, "injected_failures": 0, "logins": 0}
+
+    def count(key):
+        with sessions_lock:
+            stats[key] += 1
+
+    def require_login():
+        state = g.session_state
+        if not state["username"]: return None, redirect("/login")
+        return state, None
+
+    def courses_for(username):
+        with sessions_lock:
+            if username not in grades_by_user: grades_by_user[username] = generate_courses(username, terms, courses_per_term)
+            return grades_by_user[username]
+
+    # --- 模拟网络延迟和上游故障 ---
+    @app.before_request
+    def simulate_upstream():
+        session_id = request.cookies.get(SESSION_COOKIE)
+        with sessions_lock:
+            g.session_state = sessions.get(session_id)
+            if g.session_state is None:
+                # 与真实系统一样，没有有效会话的请求会拿到一个新的 JSESSIONID
+                g.new_session_id = uuid.uuid4().hex.upper()
+                g.session_state = sessions[g.new_session_id] = {"token": None, "username": None, "segments": {}}
+        if request.path == "/__stats": return None
+        count("requests")
+        delay = latency + random.uniform(-jitter, jitter)
+        if delay > 0: time.sleep(delay)
+        if random.random() < failure_rate:
+            count("injected_failures")
+            abort(500)
+
+    @app.after_request
+    def attach_session_cookie(response):
+        if g.get("new_session_id"): response.set_cookie(SESSION_COOKIE, g.new_session_id, path="/", httponly=True)
+        return response
+
+    # --- 登录 ---
+    @app.route("/login")
+    def login_page_view():
+        token = uuid.uuid4().hex
+        g.session_state["token"] = token
+        return re.sub(r'(name="tokenValue" value=")[^"]*', rf"\g<1>{token}", login_page)
+
+    @app.route("/img/captcha.jpg")
+    def captcha():
+        return Response(random.choice(captcha_images), mimetype="image/jpeg")
+
+    @app.route("/j_spring_security_check", methods=["POST"])
+    def security_check():
+        state = g.session_state
+        form = request.form
+        if not state["token"] or form.get("tokenValue") != state["token"]:
+            return login_page.replace("</form>", "<p class='error'>页面已过期，请刷新</p></form>")
+        if not 3 <= len(form.get("j_captcha", "")) <= 6 or random.random() < captcha_error_rate:
+            return login_page.replace("</form>", "<p class='error'>验证码输入错误</p></form>")
+        if not form.get("j_username") or "*" not in form.get("j_password", ""):
+            return login_page.replace("</form>", "<p class='error'>用户名或密码错误</p></form>")
+        state["username"] = form["j_username"]
+        state["segments"] = {}
+        count("logins")
+        return redirect("/index")
+
+    @app.route("/index")
+    def index():
+        _, login_redirect = require_login()
+        return login_redirect or index_page
+
+    @app.route("/main/academicInfo")
+    def academic_info():
+        state, login_redirect = require_login()
+        if login_redirect: return login_redirect
+        courses = courses_for(state["username"])
+        current_term = courses[-courses_per_term:]
+        return jsonify([{"gpa": round(random.Random(state["username"]).uniform(2.5, 4.0), 2), "courseNum_bxqyxd": len(current_term)}])
+
+    # --- 成绩查询：页面里嵌入每个会话不同的动态路径段 ---
+    @app.route(f"{SCORE_QUERY_PREFIX}/<page>/index")
+    def score_query_page(page):
+        state, login_redirect = require_login()
+        if login_redirect: return login_redirect
+        if page not in SCORE_QUERY_PAGES: abort(404)
+        segment = state["segments"].setdefault(page, uuid.uuid4().hex[:12])
+        api_path = f"{SCORE_QUERY_PREFIX}/{segment}/{SCORE_QUERY_PAGES[page]}"
+        return f'<html><body><script>var url = "{api_path}"; $.get(url);</script></body></html>'
+
+    @app.route(f"{SCORE_QUERY_PREFIX}/<segment>/<page>/<endpoint>")
+    def score_query_data(segment, page, endpoint):
+        state, login_redirect = require_login()
+        if login_redirect: return login_redirect
+        if state["segments"].get(page) != segment or SCORE_QUERY_PAGES.get(page) != f"{page}/{endpoint}": abort(404)
+        courses = courses_for(state["username"])
+        if page == "thisTermScores": return jsonify([{"list": courses[-courses_per_term:]}])
+        return jsonify({"lnList": [{"cjList": courses}]})
+
+    @app.route("/__stats")
+    def fake_stats():
+        with sessions_lock:
+            return jsonify(dict(stats, sessions=len(sessions)))
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="延迟的随机抖动（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="随机返回 500 的比例")
+    parser.add_argument("--captcha-error-rate", type=float, default=0.0, help="登录时随机判定验证码错误的比例")
+    parser.add_argument("--terms", type=int, default=8)
+    parser.add_argument("--courses-per-term", type=int, default=8)
+    args = parser.parse_args()
+
+    app = create_app(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                     captcha_error_rate=args.captcha_error_rate, terms=args.terms, courses_per_term=args.courses_per_term)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == "__main__":
+    main()
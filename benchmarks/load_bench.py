@@ -0,0 +1,247 @@
+# benchmarks/load_bench.py
+"""对 app.py 的各个路由做端到端压测，报告每个路由的 p50/p99 延迟和每秒请求数。
+
+默认在本进程内启动 fake_jwxs（模拟教务系统）和 app.py，并让 JWXS_BASE_URL 指向前者；
+也可以用 --app-url 压测已经运行的实例（如 gunicorn），此时需自行让该实例的 JWXS_BASE_URL
+指向 --jwxs-url 或本脚本启动的 fake_jwxs（用 --jwxs-port 固定端口）。
+调优前后各跑一次并用 --json 保存结果，便于对比。
+
+压测调优前的代码：旧版本没有 JWXS_BASE_URL 开关，也没有 /api/login_jobs、流式接口和
+/api/refresh_current_term。把旧版本检出到单独的目录，再用 --app-dir 指向它即可，例如
+    git worktree add /tmp/grades-baseline <基线提交>
+    python benchmarks/load_bench.py --app-dir /tmp/grades-baseline --cold --json before.json
+    python benchmarks/load_bench.py --cold --json after.json
+--app-dir 会在导入 app 之前把 score_logic 中所有指向正式教务系统的 URL 常量改为模拟教务系统的地址；
+被测版本没有的路由会先探测出来并在报告中标为“未提供”，不会计入失败。
+用 --app-url 压测旧版本的独立进程时，需要在启动它之前同样改写 score_logic 的 URL 常量。
+
+默认情况下除首次登录外几乎每个请求都命中成绩缓存，“上游/次”接近 0。加 --cold 时本进程内的
+app.py 以 GRADES_CACHE_TTL=0、GRADES_CACHE_STALE_TTL=0 启动，每个请求都回源（score_logic 按会话
+缓存的会话探测、姓名和学业信息仍然生效，它们属于被测的回源路径）；用 --app-url 时需自行以这两个
+环境变量启动被测实例。
+
+用法: python benchmarks/load_bench.py [--users 16] [--concurrency 8] [--requests 200] [--latency 0.05] [--cold] [--app-dir DIR] [--json before.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+import fake_jwxs
+
+PRODUCTION_BASE_URL = "https://jwxs.tiangong.edu.cn"
+
+def start_server(wsgi_app, port=0):
+    server = make_server("127.0.0.1", port, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name=f"bench-server-{server.server_port}", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def percentile(ordered, q):
+    """最近秩法百分位数，ordered 须已排序"""
+    if not ordered: return float("nan")
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+# --- 各路由的单次请求；返回 True 表示请求成功 ---
+class BenchClient:
+    """一个虚拟用户：独立的 Cookie（Flask 会话）和上次收到的 ETag"""
+    def __init__(self, app_url, username, password):
+        self.app_url = app_url
+        self.username = username
+        self.password = password
+        self.http = requests.Session()
+        self.etag = None
+
+    def post(self, path, **kwargs):
+        return self.http.post(f"{self.app_url}{path}", timeout=60, **kwargs)
+
+    def manual_login(self):
+        response = self.post("/api/manual_login_and_get_grades", json={"username": self.username, "password": self.password})
+        return response.status_code == 200 and response.json().get("success")
+
+    def login_job(self):
+        response = self.post("/api/login_jobs", json={"username": self.username, "password": self.password})
+        if response.status_code != 202: return False
+        job_url = f"{self.app_url}/api/login_jobs/{response.json()['job_id']}"
+        while True:
+            response = self.http.get(job_url, timeout=60)
+            if response.status_code != 202: return response.status_code == 200
+            time.sleep(0.05)
+
+    def index(self):
+        return self.http.get(f"{self.app_url}/", timeout=60).status_code == 200
+
+    def auto_login(self):
+        response = self.post("/api/auto_login_and_grades")
+        if response.status_code == 200: self.etag = response.headers.get("ETag")
+        return response.status_code == 200
+
+    def auto_login_not_modified(self):
+        response = self.post("/api/auto_login_and_grades", headers={"If-None-Match": self.etag} if self.etag else {})
+        return response.status_code in (200, 304)
+
+    def stream(self):
+        with self.post("/api/stream/auto_login_and_grades", stream=True) as response:
+            if response.status_code != 200: return False
+            last_event = None
+            for line in response.iter_lines():
+                if line: last_event = json.loads(line)
+            return bool(last_event) and last_event.get("type") == "done"
+
+    def refresh_current_term(self):
+        return self.post("/api/refresh_current_term").status_code == 200
+
+# (报告中的名称, 方法, 路径, 请求函数)；方法和路径用于探测被测版本是否提供该路由
+LOGIN_ROUTES = [
+    ("POST /api/manual_login_and_get_grades", "POST", "/api/manual_login_and_get_grades", BenchClient.manual_login),
+    ("POST /api/login_jobs (至完成)", "POST", "/api/login_jobs", BenchClient.login_job),
+]
+ROUTES = [
+    ("GET /", "GET", "/", BenchClient.index),
+    ("POST /api/auto_login_and_grades", "POST", "/api/auto_login_and_grades", BenchClient.auto_login),
+    ("POST /api/auto_login_and_grades (ETag)", "POST", "/api/auto_login_and_grades", BenchClient.auto_login_not_modified),
+    ("POST /api/stream/auto_login_and_grades", "POST", "/api/stream/auto_login_and_grades", BenchClient.stream),
+    ("POST /api/refresh_current_term", "POST", "/api/refresh_current_term", BenchClient.refresh_current_term),
+]
+
+def route_available(app_url, method, path):
+    """不带会话发一次请求：404/405 说明被测版本没有这个路由，其余状态码（401、415 等）都算存在"""
+    try:
+        return requests.request(method, f"{app_url}{path}", timeout=60).status_code not in (404, 405)
+    except requests.exceptions.RequestException:
+        return False
+
+def import_app(jwxs_url, app_dir=None, cold=False):
+    """在本进程内导入被测的 app.py；app_dir 指向其他检出（如调优前的基线）时从那里导入"""
+    os.environ["JWXS_BASE_URL"] = jwxs_url
+    if cold:
+        os.environ["GRADES_CACHE_TTL"] = "0"
+        os.environ["GRADES_CACHE_STALE_TTL"] = "0"
+    if app_dir:
+        app_dir = os.path.abspath(app_dir)
+        sys.path.remove(os.path.dirname(BENCH_DIR))
+        sys.path.insert(0, app_dir)
+        os.chdir(app_dir)
+    import score_logic
+    # 旧版本不读 JWXS_BASE_URL，且各 URL 常量在导入时已拼好，这里逐个改写；新版本上这一步不会改动任何值
+    for name, value in vars(score_logic).copy().items():
+        if name.isupper() and isinstance(value, str) and value.startswith(PRODUCTION_BASE_URL):
+            setattr(score_logic, name, jwxs_url + value[len(PRODUCTION_BASE_URL):])
+    import app as app_module
+    return app_module
+
+def upstream_request_count(jwxs_url):
+    try:
+        return requests.get(f"{jwxs_url}/__stats", timeout=5).json()["requests"]
+    except (requests.exceptions.RequestException, ValueError, KeyError):
+        return None
+
+def run_route(name, call, clients, total, concurrency, jwxs_url):
+    """用 concurrency 个线程轮流以各虚拟用户身份发出 total 个请求，统计延迟分布和吞吐"""
+    def timed(index):
+        started = time.perf_counter()
+        try:
+            ok = call(clients[index % len(clients)])
+        except (requests.exceptions.RequestException, ValueError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    upstream_before = upstream_request_count(jwxs_url)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(timed, range(total)))
+    elapsed = time.perf_counter() - started
+    upstream_after = upstream_request_count(jwxs_url)
+    latencies = sorted(seconds for seconds, _ in samples)
+    return {
+        "route": name, "requests": total, "errors": sum(1 for _, ok in samples if not ok),
+        "p50_ms": percentile(latencies, 50) * 1000, "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000, "req_per_s": total / elapsed,
+        "upstream_per_request": (upstream_after - upstream_before) / total if None not in (upstream_before, upstream_after) else None,
+    }
+
+def unavailable_result(name):
+    return {"route": name, "requests": 0, "errors": 0, "unavailable": True}
+
+def print_report(results, out):
+    print(f"\n{'路由':<44}{'请求':>6}{'失败':>6}{'p50(ms)':>10}{'p99(ms)':>10}{'均值(ms)':>10}{'req/s':>9}{'上游/次':>9}", file=out)
+    for r in results:
+        if r.get("unavailable"):
+            print(f"{r['route']:<44}{'未提供':>6}", file=out)
+            continue
+        upstream = "-" if r["upstream_per_request"] is None else f"{r['upstream_per_request']:.2f}"
+        print(f"{r['route']:<44}{r['requests']:>6}{r['errors']:>6}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['mean_ms']:>10.1f}{r['req_per_s']:>9.1f}{upstream:>9}", file=out)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app-url", help="压测已运行的实例；不指定时在本进程内启动 app.py")
+    parser.add_argument("--jwxs-url", help="使用已运行的模拟教务系统；不指定时在本进程内启动 fake_jwxs")
+    parser.add_argument("--jwxs-port", type=int, default=0)
+    parser.add_argument("--users", type=int, default=16, help="虚拟用户（账号）数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="每个路由的请求数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟教务系统每个请求的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--terms", type=int, default=8)
+    parser.add_argument("--courses-per-term", type=int, default=8)
+    parser.add_argument("--skip-login-jobs", action="store_true", help="不压测异步登录任务接口（被测版本没有该接口时会自动跳过）")
+    parser.add_argument("--app-dir", help="从另一个检出目录（如调优前的基线）导入 app.py；仅在不指定 --app-url 时有效")
+    parser.add_argument("--cold", action="store_true", help="关闭本进程内 app.py 的成绩缓存，每个请求都回源")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="保留 app.py 的日志输出")
+    args = parser.parse_args()
+
+    out = sys.stdout
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with quiet:
+        jwxs_url = args.jwxs_url
+        if not jwxs_url:
+            _, jwxs_url = start_server(fake_jwxs.create_app(
+                latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                terms=args.terms, courses_per_term=args.courses_per_term), args.jwxs_port)
+        print(f"模拟教务系统: {jwxs_url}", file=out)
+        app_url = args.app_url
+        if not app_url:
+            _, app_url = start_server(import_app(jwxs_url, args.app_dir, args.cold).app)
+        elif args.cold:
+            print("提示: --cold 只作用于本进程内的 app.py，请以 GRADES_CACHE_TTL=0 GRADES_CACHE_STALE_TTL=0 启动被测实例。", file=out)
+        print(f"被测应用: {app_url}{' (冷缓存)' if args.cold else ''}", file=out)
+
+        clients = [BenchClient(app_url, f"bench{index:04d}", "bench-password") for index in range(args.users)]
+        login_routes = LOGIN_ROUTES[:1] if args.skip_login_jobs else LOGIN_ROUTES
+        results = []
+        for index, (name, method, path, call) in enumerate(login_routes):
+            if not route_available(app_url, method, path):
+                results.append(unavailable_result(name))
+                continue
+            # 第一个登录路由为各虚拟用户建立会话，之后的登录路由用新的会话重复登录
+            route_clients = clients if index == 0 else [BenchClient(app_url, client.username, client.password) for client in clients]
+            results.append(run_route(name, call, route_clients, len(route_clients), args.concurrency, jwxs_url))
+        for name, method, path, call in ROUTES:
+            if not route_available(app_url, method, path):
+                results.append(unavailable_result(name))
+                continue
+            results.append(run_route(name, call, clients, args.requests, args.concurrency, jwxs_url))
+
+    print_report(results, out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}", file=out)
+
+if __name__ == "__main__":
+    main()
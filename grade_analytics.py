@@ -0,0 +1,100 @@
+# grade_analytics.py
+import math
+from array import array
+from itertools import compress
+from operator import mul
+
+NAN = float("nan")
+PASS_SCORE = 60.0
+FAILING_LEVELS = frozenset({"不及格", "不合格", "缺考"})
+
+def _to_float(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return NAN
+    return number if math.isfinite(number) else NAN
+
+class CourseTable:
+    """处理后课程列表的列式存储：每个字段一列 array，同一学期的课程连续存放在 term_ranges 对应的区间内。
+
+    字符串到数值的转换和各类条件判断都在建表时完成一次，统计时只对列切片做 sum / compress。
+    """
+    __slots__ = ("term_names", "term_ranges", "credit", "grade_point", "graded", "passed",
+                 "credit_mask", "earned_mask", "gpa_mask")
+
+    def __init__(self):
+        self.term_names = []
+        self.term_ranges = []      # (起始行, 结束行)
+        self.credit = array("d")
+        self.grade_point = array("d")
+        self.graded = array("b")       # 已公布成绩（分数或等级）
+        self.passed = array("b")
+        self.credit_mask = array("b")  # 已公布且学分有效，计入已修学分
+        self.earned_mask = array("b")  # 计入已获学分
+        self.gpa_mask = array("b")     # 计入学分加权绩点
+
+    @classmethod
+    def from_terms(cls, terms):
+        table = cls()
+        for term in terms:
+            table.add_term(term["termName"], term["list"])
+        return table
+
+    def add_term(self, term_name, courses):
+        start = len(self.credit)
+        for course in courses:
+            credit = _to_float(course.get("credit"))
+            grade_point = _to_float(course.get("gradePoint"))
+            # 百分制课程按分数判断是否通过；等级制课程（优秀/良好/合格等）没有数值分数，按等级判断
+            level = course.get("levelName")
+            if course.get("isValidScore"):
+                graded, passed = True, _to_float(course.get("courseScore")) >= PASS_SCORE
+            else:
+                graded = bool(level) and level != "N/A"
+                passed = graded and level not in FAILING_LEVELS
+            has_credit = graded and credit > 0  # NaN 比较结果为 False
+            self.credit.append(credit if has_credit else 0.0)
+            self.grade_point.append(grade_point if grade_point == grade_point else 0.0)
+            self.graded.append(graded)
+            self.passed.append(passed)
+            self.credit_mask.append(has_credit)
+            self.earned_mask.append(has_credit and passed)
+            self.gpa_mask.append(has_credit and grade_point == grade_point)
+        self.term_names.append(term_name)
+        self.term_ranges.append((start, len(self.credit)))
+
+    def __len__(self):
+        return len(self.credit)
+
+_SUMMARY_KEYS = ("announced", "passed", "failed", "credits_attempted", "credits_earned", "weighted_points", "gpa_credits")
+
+def _summarize_range(table, start, end):
+    credit = table.credit[start:end]
+    gpa_mask = table.gpa_mask[start:end]
+    announced = sum(table.graded[start:end])
+    passed = sum(table.passed[start:end])
+    return {
+        "announced": announced, "passed": passed, "failed": announced - passed,
+        "credits_attempted": sum(compress(credit, table.credit_mask[start:end])),
+        "credits_earned": sum(compress(credit, table.earned_mask[start:end])),
+        "weighted_points": sum(map(mul, compress(credit, gpa_mask), compress(table.grade_point[start:end], gpa_mask))),
+        "gpa_credits": sum(compress(credit, gpa_mask)),
+    }
+
+def _finish(summary):
+    gpa_credits = summary.pop("gpa_credits")
+    weighted_points = summary.pop("weighted_points")
+    summary["gpa"] = round(weighted_points / gpa_credits, 2) if gpa_credits else None
+    summary["credits_attempted"] = round(summary["credits_attempted"], 2)
+    summary["credits_earned"] = round(summary["credits_earned"], 2)
+    return summary
+
+def summarize(table):
+    """按学期对各列切片求和，得到每个学期和累计的学分加权绩点、通过/未通过门数、学分合计"""
+    per_term = [_summarize_range(table, start, end) for start, end in table.term_ranges]
+    total = {key: sum(summary[key] for summary in per_term) for key in _SUMMARY_KEYS}
+    return dict(zip(table.term_names, map(_finish, per_term))), _finish(total)
+
+def format_gpa(gpa):
+    return "N/A" if gpa is None else f"{gpa:.2f}"
@@ -0,0 +1,99 @@
+# grades_cache.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 缓存配置 ---
+CACHE_TTL = float(os.environ.get("GRADES_CACHE_TTL", "120"))              # 新鲜期（秒）
+CACHE_STALE_TTL = float(os.environ.get("GRADES_CACHE_STALE_TTL", "1800"))  # 过期后仍可直接返回的时长（秒）
+CACHE_PROVISIONAL_TTL = float(os.environ.get("GRADES_CACHE_PROVISIONAL_TTL", "15"))  # 缺少学业信息的临时结果的新鲜期（秒）
+CACHE_MAX_ENTRIES = int(os.environ.get("GRADES_CACHE_MAX_ENTRIES", "1024"))
+
+class GradesCache:
+    """按学号缓存 get_full_data 的处理结果：LRU 淘汰 + TTL + stale-while-revalidate"""
+
+    def __init__(self, ttl=CACHE_TTL, stale_ttl=CACHE_STALE_TTL, max_entries=CACHE_MAX_ENTRIES, refresh_workers=4,
+                 provisional_ttl=CACHE_PROVISIONAL_TTL):
+        self.ttl = ttl
+        self.provisional_ttl = min(provisional_ttl, ttl)
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stored_at, ttl, payload)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._refresh_executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="grades-refresh")
+
+    def get(self, key):
+        """返回 (payload, 状态)，状态为 fresh / stale / miss"""
+        if key is None: return None, "miss"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None: return None, "miss"
+            stored_at, ttl, payload = entry
+            age = time.monotonic() - stored_at
+            if age > ttl + self.stale_ttl:
+                del self._entries[key]
+                return None, "miss"
+            self._entries.move_to_end(key)
+            return payload, "fresh" if age <= ttl else "stale"
+
+    def _ttl_for(self, payload):
+        # 学业信息超时时结果里的官方 GPA 是默认值，只短暂缓存，尽快用完整数据替换
+        return self.provisional_ttl if payload.get("provisional") else self.ttl
+
+    def set(self, key, payload):
+        if key is None or not payload or not payload.get("success"): return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), self._ttl_for(payload), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def replace(self, key, old_payload, new_payload):
+        """仅当缓存中仍是 old_payload 时替换为 new_payload（保留原写入时间），避免覆盖期间写入的更新数据"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] is not old_payload: return False
+            self._entries[key] = (entry[0], self._ttl_for(new_payload), new_payload)
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def refresh_in_background(self, key, loader):
+        """同一学号同一时间只会有一个后台刷新任务，其余请求直接复用旧数据"""
+        with self._lock:
+            if key in self._refreshing: return False
+            self._refreshing.add(key)
+        self._refresh_executor.submit(self._run_refresh, key, loader)
+        return True
+
+    def _run_refresh(self, key, loader):
+        try:
+            payload = loader()
+            if payload and payload.get("success"):
+                self.set(key, payload)
+                print(f"[{time.strftime('%H:%M:%S')}] 后台刷新 {key} 的成绩缓存成功。")
+            else:
+                # 刷新失败通常意味着上游会话已失效，不再继续提供旧数据
+                self.invalidate(key)
+                print(f"[{time.strftime('%H:%M:%S')}] 后台刷新 {key} 的成绩缓存失败，已移除缓存。")
+        except Exception as e:
+            print(f"[{time.strftime('%H:%M:%S')}] 后台刷新 {key} 的成绩缓存时发生错误: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_load(self, key, loader):
+        """新鲜命中直接返回；过期命中先返回旧数据再后台刷新；未命中则同步加载"""
+        payload, status = self.get(key)
+        if status == "fresh": return payload, status
+        if status == "stale":
+            self.refresh_in_background(key, loader)
+            return payload, status
+        payload = loader()
+        self.set(key, payload)
+        return payload, status
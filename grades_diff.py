@@ -0,0 +1,87 @@
+# grades_diff.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+# --- 版本号：对处理后的成绩数据做内容哈希 ---
+def content_hash(value, length=16):
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:length]
+
+def course_keys(course_list):
+    """课程在学期内的标识：课程名 + 考试类型 + 同名序号（前端 script.js 使用相同规则）"""
+    seen = {}
+    keys = []
+    for course in course_list:
+        base = f"{course.get('courseName') or ''}|{course.get('examTypeName') or ''}"
+        seen[base] = seen.get(base, 0) + 1
+        keys.append(f"{base}#{seen[base]}")
+    return keys
+
+def course_fingerprints(course_list):
+    return {key: content_hash(course) for key, course in zip(course_keys(course_list), course_list)}
+
+# 学业信息晚到时只有这些字段会变化（本地与官方 GPA 相同时 overall_gpa 也不变），都要计入版本号
+VERSIONED_GPA_FIELDS = ("overall_gpa", "gpa_source", "official_gpa", "local_gpa", "course_count", "provisional")
+
+def stamp_versions(payload):
+    """为每个学期和整个返回数据写入版本号，版本号随内容变化而变化"""
+    for term in payload["all_grades"]:
+        term["version"] = content_hash(term["list"])
+    payload["version"] = content_hash([
+        payload.get("user_name"), payload.get("current_stats"),
+        [payload.get(key) for key in VERSIONED_GPA_FIELDS],
+        [(term["termName"], term.get("termLabel"), term.get("isCurrent", False), term["version"]) for term in payload["all_grades"]],
+    ])
+    return payload
+
+# --- 每个学生最近几个版本的课程指纹，用于计算增量 ---
+class VersionHistory:
+    def __init__(self, versions_per_student=5, max_students=1024):
+        self.versions_per_student = versions_per_student
+        self.max_students = max_students
+        self._students = OrderedDict()  # 学号 -> OrderedDict(版本号 -> {学期名: 课程指纹})
+        self._lock = threading.Lock()
+
+    def remember(self, student_id, payload):
+        if student_id is None: return
+        version = payload["version"]
+        with self._lock:
+            versions = self._students.get(student_id)
+            if versions is not None and version in versions:
+                self._students.move_to_end(student_id)
+                return
+        fingerprints = {term["termName"]: course_fingerprints(term["list"]) for term in payload["all_grades"]}
+        with self._lock:
+            versions = self._students.setdefault(student_id, OrderedDict())
+            versions[version] = fingerprints
+            while len(versions) > self.versions_per_student:
+                versions.popitem(last=False)
+            self._students.move_to_end(student_id)
+            while len(self._students) > self.max_students:
+                self._students.popitem(last=False)
+
+    def lookup(self, student_id, version):
+        with self._lock:
+            versions = self._students.get(student_id)
+            return versions.get(version) if versions else None
+
+    def forget(self, student_id):
+        with self._lock:
+            self._students.pop(student_id, None)
+
+def build_diff(payload, base_fingerprints, since):
+    """只返回相对 since 版本新增或变化的课程；学期列表只带元数据，不带课程"""
+    terms, changes = [], {}
+    for term in payload["all_grades"]:
+        terms.append({key: value for key, value in term.items() if key != "list"})
+        old = base_fingerprints.get(term["termName"], {})
+        keys = course_keys(term["list"])
+        upserts = [dict(course, key=key) for key, course in zip(keys, term["list"]) if old.get(key) != content_hash(course)]
+        removed = sorted(set(old) - set(keys))
+        if upserts or removed:
+            changes[term["termName"]] = {"upserts": upserts, "removed": removed}
+    diff = {key: value for key, value in payload.items() if key != "all_grades"}
+    diff.update({"mode": "diff", "since": since, "terms": terms, "changes": changes})
+    return diff
@@ -0,0 +1,22 @@
+# gunicorn.conf.py
+import os
+
+# 登录任务、成绩缓存和上游会话池都保存在进程内存中，因此默认只启动一个 gthread worker；
+# 上游请求是 IO 密集型，由线程并发处理，CPU 密集的验证码识别交给 OCR 进程池
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+os.environ.setdefault("GRADES_LOGIN_WORKERS", str(threads))  # 登录任务线程池与请求线程数保持一致
+os.environ.setdefault("GRADES_FETCH_WORKERS", str(2 * threads))  # 每个请求线程同时等待姓名和成绩两个上游请求
+os.environ.setdefault("GRADES_ACADEMIC_WORKERS", str(threads))
+
+# 主进程预加载应用和 OCR 模型，fork 后各 worker 以写时复制方式持有一份，仅在识别进程池不可用时使用；
+# 识别进程池中的每个子进程都会各自加载模型，因此按 worker 数均分 CPU 核数，避免 N 个 worker 各开满核数的进程
+preload_app = True
+os.environ.setdefault("OCR_START_POOL_ON_IMPORT", "0")
+os.environ.setdefault("OCR_POOL_SIZE", str(max(1, (os.cpu_count() or 1) // max(1, workers))))
+
+def post_fork(server, worker):
+    # 进程池不能跨 fork 复用，每个 worker 在 fork 后各自启动并预热
+    import ocr_engine
+    ocr_engine.start_pool()
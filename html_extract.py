@@ -0,0 +1,69 @@
+# html_extract.py
+import html
+import re
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:  # lxml 不可用时跳过该提取器
+    lxml = None
+
+# --- 页面字段提取：按顺序尝试快速提取器，页面结构变化时回退到 BeautifulSoup ---
+_TOKEN_INPUT_RE = re.compile(r'<input\b[^>]*\bname\s*=\s*["\']tokenValue["\'][^>]*>', re.IGNORECASE)
+_VALUE_ATTR_RE = re.compile(r'\bvalue\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+_USER_INFO_RE = re.compile(r'<span\b[^>]*\bclass\s*=\s*["\'][^"\']*\buser-info\b[^"\']*["\'][^>]*>(.*?)</span>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+def _token_regex(page):
+    tag = _TOKEN_INPUT_RE.search(page)
+    if not tag: return None
+    value = _VALUE_ATTR_RE.search(tag.group(0))
+    if not value: return None
+    return html.unescape(value.group(1) if value.group(1) is not None else value.group(2))
+
+def _token_lxml(page):
+    values = lxml.html.fromstring(page).xpath('//input[@name="tokenValue"]/@value')
+    return values[0] if values else None
+
+def _token_soup(page):
+    token_input = BeautifulSoup(page, 'html.parser').find('input', {'name': 'tokenValue'})
+    if token_input and 'value' in token_input.attrs: return token_input['value']
+    return None
+
+def _strip_greeting(user_info):
+    """去掉“欢迎您，”前缀；只剩问候语（如嵌套 span 被正则截断）时返回 None，让下一个提取器接手"""
+    if not user_info: return None
+    return user_info.replace("欢迎您，", "").strip() or None
+
+def _user_info_regex(page):
+    match = _USER_INFO_RE.search(page)
+    if not match: return None
+    return _strip_greeting(html.unescape("".join(part.strip() for part in _TAG_RE.split(match.group(1)))))
+
+def _user_info_lxml(page):
+    spans = lxml.html.fromstring(page).xpath('//span[contains(concat(" ", normalize-space(@class), " "), " user-info ")]')
+    return _strip_greeting("".join(text.strip() for text in spans[0].itertext())) if spans else None
+
+def _user_info_soup(page):
+    user_info_span = BeautifulSoup(page, 'html.parser').find('span', class_='user-info')
+    return _strip_greeting(user_info_span.get_text(strip=True)) if user_info_span else None
+
+TOKEN_EXTRACTORS = [_token_regex] + ([_token_lxml] if lxml else []) + [_token_soup]
+USER_INFO_EXTRACTORS = [_user_info_regex] + ([_user_info_lxml] if lxml else []) + [_user_info_soup]
+
+def extract_first(extractors, page):
+    """依次调用提取器，返回第一个非空结果；单个提取器出错时继续尝试下一个"""
+    for extractor in extractors:
+        try:
+            value = extractor(page)
+        except Exception:
+            continue
+        if value: return value
+    return None
+
+def extract_token(page):
+    return extract_first(TOKEN_EXTRACTORS, page)
+
+def extract_user_name(page):
+    return extract_first(USER_INFO_EXTRACTORS, page)
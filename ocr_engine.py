@@ -0,0 +1,187 @@
+# ocr_engine.py
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# --- DdddOcr 导入 ---
+import ddddocr
+
+# --- 配置信息 ---
+OCR_CHARSET = "abcdefghijklmnopqrstuvwxyz0123456789"
+OCR_POOL_SIZE = int(os.environ.get("OCR_POOL_SIZE", str(os.cpu_count() or 1)))  # 0 表示在请求线程内识别；多 worker 部署时由 gunicorn.conf.py 按 worker 数均分
+OCR_TIMEOUT = float(os.environ.get("OCR_TIMEOUT", "5"))
+
+def _build_client():
+    client = ddddocr.DdddOcr()
+    client.set_ranges(OCR_CHARSET)
+    return client
+
+# --- 当前进程内的客户端（预加载 / 进程池不可用时使用） ---
+_client = None
+_client_lock = threading.Lock()
+
+def get_ocr_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+                print(f"[{time.strftime('%H:%M:%S')}] DdddOcr 客户端已初始化 (pid={os.getpid()})。")
+    return _client
+
+# --- 识别进程池（子进程内各自加载一次模型） ---
+_worker_client = None
+
+def _init_worker():
+    global _worker_client
+    _worker_client = _build_client()
+
+def _classify_in_worker(image_bytes):
+    return _worker_client.classification(image_bytes) if image_bytes else None
+
+def _ping_worker():
+    return os.getpid()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pool_start_lock = threading.Lock()
+
+def _get_pool():
+    """返回当前进程通过 start_pool 启动的进程池；未启动（或是 fork 出的子进程）时返回 None，在进程内识别"""
+    pool = _pool
+    return pool if pool is not None and _pool_pid == os.getpid() else None
+
+def _reset_pool(broken_pool):
+    """丢弃已损坏的进程池；若其他线程已换上新池则保持不动"""
+    global _pool
+    with _pool_lock:
+        if _pool is not broken_pool: return
+        if _pool_pid == os.getpid(): _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def start_pool():
+    """启动进程池并让每个子进程提前加载模型，全部就绪后才用于识别，避免登录请求承担冷启动开销"""
+    global _pool, _pool_pid
+    if OCR_POOL_SIZE <= 0: return
+    with _pool_start_lock:
+        if _get_pool() is not None: return
+        pool = ProcessPoolExecutor(max_workers=OCR_POOL_SIZE, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker)
+        try:
+            pids = {f.result(timeout=60) for f in [pool.submit(_ping_worker) for _ in range(OCR_POOL_SIZE)]}
+        except Exception as e:
+            print(f"[{time.strftime('%H:%M:%S')}] OCR 进程池预热失败，将在当前进程内识别: {e}")
+            pool.shutdown(wait=False, cancel_futures=True)
+            return
+        with _pool_lock:
+            _pool, _pool_pid = pool, os.getpid()
+        print(f"[{time.strftime('%H:%M:%S')}] OCR 进程池已就绪，共 {len(pids)} 个进程。")
+
+def _restart_pool_in_background(broken_pool):
+    _reset_pool(broken_pool)
+    threading.Thread(target=start_pool, name="ocr-pool-restart", daemon=True).start()
+
+def warm_up(start_pool_now=False):
+    # 识别子进程以 spawn 方式启动时会重新导入主模块，这里避免在子进程中递归预热
+    if multiprocessing.parent_process() is not None: return
+    get_ocr_client()
+    if start_pool_now: start_pool()
+
+# --- 延迟与准确率统计 ---
+class OcrStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.recognized = 0
+        self.empty = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.accepted = 0
+        self.rejected = 0
+
+    def record_recognition(self, code, latency):
+        with self._lock:
+            if code: self.recognized += 1
+            else: self.empty += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_outcome(self, accepted):
+        with self._lock:
+            if accepted: self.accepted += 1
+            else: self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            attempts = self.recognized + self.empty
+            judged = self.accepted + self.rejected
+            return {
+                "recognized": self.recognized, "empty": self.empty, "errors": self.errors,
+                "avg_latency_ms": round(self.total_latency / attempts * 1000, 2) if attempts else 0.0,
+                "max_latency_ms": round(self.max_latency * 1000, 2),
+                "accepted": self.accepted, "rejected": self.rejected,
+                "accuracy": round(self.accepted / judged, 4) if judged else None,
+            }
+
+ocr_stats = OcrStats()
+
+def record_outcome(accepted):
+    """由登录流程回报验证码是否被教务系统接受，用于统计识别准确率"""
+    ocr_stats.record_outcome(accepted)
+
+def get_stats():
+    return ocr_stats.snapshot()
+
+# --- 识别接口 ---
+def _classify_local(image_bytes):
+    return get_ocr_client().classification(image_bytes)
+
+def recognize(image_bytes, timeout=OCR_TIMEOUT):
+    started = time.perf_counter()
+    try:
+        pool = _get_pool()
+        if pool is not None:
+            try:
+                code = pool.submit(_classify_in_worker, image_bytes).result(timeout=timeout)
+            except BrokenProcessPool:
+                _restart_pool_in_background(pool)
+                code = _classify_local(image_bytes)
+        else:
+            code = _classify_local(image_bytes)
+    except Exception as e:
+        ocr_stats.record_error()
+        print(f"[{time.strftime('%H:%M:%S')}] 调用 DdddOcr 识别验证码时发生错误: {e}")
+        return None
+    ocr_stats.record_recognition(code, time.perf_counter() - started)
+    return code or None
+
+def recognize_batch(images, timeout=OCR_TIMEOUT):
+    """批量识别验证码，结果顺序与输入一致；单张失败时对应位置为 None"""
+    images = list(images)
+    pool = _get_pool()
+    if pool is None:
+        return [recognize(image_bytes, timeout) for image_bytes in images]
+    started = time.perf_counter()
+    futures = [pool.submit(_classify_in_worker, image_bytes) for image_bytes in images]
+    results = []
+    for future in futures:
+        try:
+            code = future.result(timeout=timeout)
+        except BrokenProcessPool:
+            _restart_pool_in_background(pool)
+            return results + [recognize(image_bytes, timeout) for image_bytes in images[len(results):]]
+        except Exception as e:
+            ocr_stats.record_error()
+            print(f"[{time.strftime('%H:%M:%S')}] 批量识别验证码时发生错误: {e}")
+            results.append(None)
+            continue
+        ocr_stats.record_recognition(code, time.perf_counter() - started)
+        results.append(code or None)
+    return results
@@ -0,0 +1,227 @@
+# poller.py
+"""多账号后台成绩轮询服务。
+
+按可配置的频率为每个账号抓取成绩，并对每个课程列表（cjList）做内容哈希，
+只有内容真正变化时才调用 on_change 回调。所有账号共享一个全局的上游并发上限，
+每个账号另有最短轮询间隔和失败退避，避免对教务系统造成压力。
+
+用法: python poller.py accounts.json [--interval 600] [--concurrency 8] [--all-terms]
+accounts.json 为 [{"username": "...", "password": "..."}, ...]
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from score_logic import get_dynamic_token, login, fetch_grades, fetch_all_grades, iter_course_lists
+from upstream_pool import create_upstream_session
+
+# --- 轮询配置 ---
+POLL_INTERVAL = float(os.environ.get("POLL_INTERVAL", "600"))                  # 每个账号的目标轮询间隔（秒）
+POLL_MIN_ACCOUNT_INTERVAL = float(os.environ.get("POLL_MIN_ACCOUNT_INTERVAL", "120"))  # 单账号两次轮询的最短间隔
+POLL_MAX_BACKOFF = float(os.environ.get("POLL_MAX_BACKOFF", "3600"))            # 连续失败时的最长退避
+POLL_MAX_CONCURRENCY = int(os.environ.get("POLL_MAX_CONCURRENCY", "8"))         # 全局同时进行的上游请求数
+POLL_WORKERS = int(os.environ.get("POLL_WORKERS", "32"))
+
+def hash_course_list(course_list):
+    """课程列表的内容哈希，与字段顺序无关"""
+    payload = json.dumps(course_list, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def diff_hashes(old_hashes, new_hashes):
+    return {
+        "added": sorted(set(new_hashes) - set(old_hashes)),
+        "removed": sorted(set(old_hashes) - set(new_hashes)),
+        "changed": sorted(key for key in set(new_hashes) & set(old_hashes) if new_hashes[key] != old_hashes[key]),
+    }
+
+class ThrottledSession(requests.Session):
+    """每个上游请求都要先获取全局信号量，从而限制所有账号合计的并发请求数"""
+    semaphore = None
+
+    def request(self, *args, **kwargs):
+        if self.semaphore is None: return super().request(*args, **kwargs)
+        with self.semaphore:
+            return super().request(*args, **kwargs)
+
+class PolledAccount:
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.session = None
+        self.hashes = None
+        self.failures = 0
+        self.last_polled = None
+        self.last_changed = None
+        self.schedule_sequence = None  # 调度堆中当前有效条目的序号，其余同名条目均已作废
+
+class GradesPoller:
+    def __init__(self, on_change=None, interval=POLL_INTERVAL, min_account_interval=POLL_MIN_ACCOUNT_INTERVAL,
+                 max_concurrency=POLL_MAX_CONCURRENCY, workers=POLL_WORKERS, all_terms=False, notify_initial=False):
+        self.on_change = on_change
+        self.interval = interval
+        self.min_account_interval = min_account_interval
+        self.fetch = fetch_all_grades if all_terms else fetch_grades
+        self.notify_initial = notify_initial
+        self._session_class = type("PollerSession", (ThrottledSession,), {"semaphore": threading.BoundedSemaphore(max_concurrency)})
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grades-poller")
+        self._accounts = {}
+        self._schedule = []  # (到期时间, 序号, 学号)；每个账号只有序号等于 schedule_sequence 的条目有效
+        self._sequence = itertools.count()
+        self._in_flight = set()
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {"polls": 0, "changes": 0, "failures": 0, "logins": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    # --- 账号管理 ---
+    def add_account(self, username, password, first_poll_in=None):
+        """新账号在一个轮询周期内随机错开首次轮询，避免所有账号同时请求。
+
+        已有账号再次加入时只更新密码；指定 first_poll_in 时用新的到期时间替换原有调度，而不是再加一条。
+        """
+        with self._condition:
+            account = self._accounts.get(username)
+            if account is not None:
+                account.password = password
+                if first_poll_in is None: return
+                self._push_locked(account, time.monotonic() + first_poll_in)
+            else:
+                account = self._accounts[username] = PolledAccount(username, password)
+                delay = random.uniform(0, self.interval) if first_poll_in is None else first_poll_in
+                self._push_locked(account, time.monotonic() + delay)
+            self._condition.notify()
+
+    def remove_account(self, username):
+        with self._condition:
+            account = self._accounts.pop(username, None)
+        if account and account.session: account.session.close()
+
+    def _push_locked(self, account, due):
+        account.schedule_sequence = next(self._sequence)
+        heapq.heappush(self._schedule, (due, account.schedule_sequence, account.username))
+
+    # --- 调度循环 ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="grades-poller-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread: self._thread.join()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._condition:
+                now = time.monotonic()
+                due_accounts = []
+                while self._schedule and self._schedule[0][0] <= now:
+                    _, sequence, username = heapq.heappop(self._schedule)
+                    account = self._accounts.get(username)
+                    if account is None or sequence != account.schedule_sequence or username in self._in_flight: continue
+                    # 无论调度条目从何而来，同一账号两次轮询之间都至少间隔 min_account_interval
+                    earliest = account.last_polled + self.min_account_interval if account.last_polled is not None else now
+                    if earliest > now:
+                        self._push_locked(account, earliest)
+                        continue
+                    self._in_flight.add(username)
+                    due_accounts.append(account)
+                if not due_accounts:
+                    timeout = self._schedule[0][0] - now if self._schedule else None
+                    self._condition.wait(timeout)
+                    continue
+            for account in due_accounts:
+                self._executor.submit(self._poll_and_reschedule, account)
+
+    def _poll_and_reschedule(self, account):
+        try:
+            succeeded = self.poll_account(account)
+        except Exception as e:
+            print(f"[{time.strftime('%H:%M:%S')}] 轮询 {account.username} 时发生错误: {e}")
+            succeeded = False
+        with self._condition:
+            self._in_flight.discard(account.username)
+            if self._accounts.get(account.username) is not account: return
+            if succeeded:
+                account.failures = 0
+                delay = max(self.interval * random.uniform(0.9, 1.1), self.min_account_interval)
+            else:
+                account.failures += 1
+                self._count("failures")
+                delay = min(self.interval * (2 ** account.failures), POLL_MAX_BACKOFF)
+            self._push_locked(account, time.monotonic() + delay)
+            self._condition.notify()
+
+    # --- 单个账号的一次轮询 ---
+    def _login(self, account):
+        if account.session: account.session.close()
+        account.session = create_upstream_session(pool_connections=1, pool_maxsize=1, session_class=self._session_class)
+        dynamic_token = get_dynamic_token(account.session)
+        self._count("logins")
+        return bool(dynamic_token) and login(account.session, account.username, account.password, dynamic_token)
+
+    def poll_account(self, account):
+        account.last_polled = time.monotonic()
+        self._count("polls")
+        if account.session is None and not self._login(account): return False
+        grades_data = self.fetch(account.session)
+        if grades_data is None:
+            # 抓取失败多半是会话过期，重新登录后再试一次
+            if not self._login(account): return False
+            grades_data = self.fetch(account.session)
+            if grades_data is None: return False
+        new_hashes = {key: hash_course_list(course_list) for key, course_list in iter_course_lists(grades_data)}
+        old_hashes, account.hashes = account.hashes, new_hashes
+        if old_hashes is None and not self.notify_initial: return True
+        changes = diff_hashes(old_hashes or {}, new_hashes)
+        if any(changes.values()):
+            account.last_changed = time.time()
+            self._count("changes")
+            print(f"[{time.strftime('%H:%M:%S')}] 检测到 {account.username} 的成绩变化: {changes}")
+            if self.on_change: self.on_change(account.username, changes, grades_data)
+        return True
+
+def main():
+    parser = argparse.ArgumentParser(description="多账号后台成绩轮询")
+    parser.add_argument("accounts", help="账号列表 JSON 文件")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL)
+    parser.add_argument("--min-account-interval", type=float, default=POLL_MIN_ACCOUNT_INTERVAL)
+    parser.add_argument("--concurrency", type=int, default=POLL_MAX_CONCURRENCY)
+    parser.add_argument("--workers", type=int, default=POLL_WORKERS)
+    parser.add_argument("--all-terms", action="store_true", help="轮询全部历史成绩而不是当前学期")
+    args = parser.parse_args()
+
+    with open(args.accounts, encoding="utf-8") as f:
+        accounts = json.load(f)
+    poller = GradesPoller(interval=args.interval, min_account_interval=args.min_account_interval,
+                          max_concurrency=args.concurrency, workers=args.workers, all_terms=args.all_terms)
+    for account in accounts:
+        poller.add_account(account["username"], account["password"])
+    print(f"[{time.strftime('%H:%M:%S')}] 开始轮询 {len(accounts)} 个账号，间隔 {args.interval} 秒。")
+    poller.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(f"[{time.strftime('%H:%M:%S')}] 轮询统计: {poller.stats}")
+    except KeyboardInterrupt:
+        poller.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# retry_policy.py
+import random
+import threading
+import time
+
+class Deadline:
+    """一次请求（或一次登录流程）的总时间预算；调用 cancel() 后退避等待立即结束，流程不再重试"""
+
+    def __init__(self, budget=None):
+        self.expires_at = None if budget is None else time.monotonic() + budget
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def sleep(self, seconds):
+        """等待 seconds 秒；期间被取消时提前返回 False"""
+        return not self._cancelled.wait(seconds)
+
+    def remaining(self):
+        if self.expires_at is None: return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.cancelled() or (self.expires_at is not None and time.monotonic() >= self.expires_at)
+
+    def timeout(self, per_call):
+        """单次调用的超时：取单次上限与剩余预算中较小者"""
+        remaining = self.remaining()
+        return per_call if remaining is None else max(0.1, min(per_call, remaining))
+
+class Backoff:
+    """带抖动的指数退避（full jitter）"""
+
+    def __init__(self, base=0.5, cap=4.0, multiplier=2.0):
+        self.base = base
+        self.cap = cap
+        self.multiplier = multiplier
+
+    def delay(self, attempt):
+        ceiling = min(self.cap, self.base * (self.multiplier ** max(attempt - 1, 0)))
+        return random.uniform(self.base / 2, max(ceiling, self.base / 2))
+
+def wait_before_retry(backoff, attempt, deadline=None):
+    """等待下一次重试；预算耗尽或被取消时返回 False，调用方应停止重试"""
+    delay = backoff.delay(attempt)
+    if deadline is None:
+        time.sleep(delay)
+        return True
+    remaining = deadline.remaining()
+    if deadline.cancelled() or (remaining is not None and remaining <= delay): return False
+    return deadline.sleep(delay)
+
+# --- 各调用点的默认策略 ---
+CAPTCHA_BACKOFF = Backoff(base=0.3, cap=1.5)
+LOGIN_BACKOFF = Backoff(base=0.5, cap=3.0)
+ACADEMIC_INFO_BACKOFF = Backoff(base=0.25, cap=2.0)
+LOGIN_BUDGET = 45.0          # 一次完整登录（含验证码重试）的总预算（秒）
+ACADEMIC_INFO_BUDGET = 8.0   # 学业信息重试的总预算（秒）
+
@@ -4,18 +4,23 @@ import hashlib
 import json
 import os
 from PIL import Image
-from bs4 import BeautifulSoup
+from html_extract import extract_token, extract_user_name
 import re
 import base64
 import time
-import random
+import threading
+import weakref
 
-# --- DdddOcr 导入 ---
-import ddddocr
+# --- 验证码识别引擎 ---
+import ocr_engine
+from retry_policy import (
+    Deadline, wait_before_retry, CAPTCHA_BACKOFF, LOGIN_BACKOFF,
+    ACADEMIC_INFO_BACKOFF, LOGIN_BUDGET, ACADEMIC_INFO_BUDGET
+)
 
 # --- 配置信息 ---
 CREDENTIALS_FILE = "user_credentials.json"
-BASE_URL = "https://jwxs.tiangong.edu.cn"
+BASE_URL = os.environ.get("JWXS_BASE_URL", "https://jwxs.tiangong.edu.cn").rstrip("/")  # 压测时可指向 benchmarks/fake_jwxs.py
 LOGIN_PAGE_URL = f"{BASE_URL}/login"
 LOGIN_URL = f"{BASE_URL}/j_spring_security_check"
 CAPTCHA_URL = f"{BASE_URL}/img/captcha.jpg"
@@ -23,6 +28,21 @@ GRADES_INDEX_PAGE_URL = f"{BASE_URL}/student/integratedQuery/scoreQuery/thisTerm
 ALL_GRADES_INDEX_PAGE_URL = f"{BASE_URL}/student/integratedQuery/scoreQuery/coursePropertyScores/index"
 USER_INDEX_PAGE_URL = f"{BASE_URL}/index"
 ACADEMIC_INFO_URL = f"{BASE_URL}/main/academicInfo"
+SCORE_QUERY_API_URL = f"{BASE_URL}/student/integratedQuery/scoreQuery/{{segment}}/{{endpoint}}"
+ALL_GRADES_ENDPOINT = "coursePropertyScores/callback"
+CURRENT_TERM_ENDPOINT = "thisTermScores/data"
+SESSION_ALIVE_TTL = 60  # 会话探测成功结果的缓存时长（秒）
+
+# --- 每个上游会话的附加状态（如动态路径段），随会话对象一起回收 ---
+_session_states = weakref.WeakKeyDictionary()
+_session_states_lock = threading.Lock()
+
+def get_session_state(session_obj):
+    with _session_states_lock:
+        state = _session_states.get(session_obj)
+        if state is None:
+            state = _session_states[session_obj] = {}
+        return state
 
 # --- MD5 加密函数（从JavaScript代码转换而来）---
 def hex_md5(s, ver=None):
@@ -71,34 +91,23 @@ def load_credentials():
             return None, None
     return None, None
 
-# --- DdddOcr 客户端初始化 ---
-_ddddocr_client = None
+# --- DdddOcr 客户端（由 ocr_engine 统一管理，启动时预加载） ---
 def get_ddddocr_client():
-    global _ddddocr_client
-    if _ddddocr_client is None:
-        _ddddocr_client = ddddocr.DdddOcr()
-        _ddddocr_client.set_ranges("abcdefghijklmnopqrstuvwxyz0123456789")
-        print(f"[{time.strftime('%H:%M:%S')}] DdddOcr 客户端已初始化。")
-    return _ddddocr_client
+    return ocr_engine.get_ocr_client()
 
 def recognize_captcha_with_ddddocr(image_bytes):
-    try:
-        ocr_client = get_ddddocr_client()
-        recognized_code = ocr_client.classification(image_bytes)
-        if recognized_code:
-            print(f"[{time.strftime('%H:%M:%S')}] DdddOcr 识别成功，结果: {recognized_code}")
-            return recognized_code
-        return None
-    except Exception as e:
-        print(f"[{time.strftime('%H:%M:%M')}] 调用 DdddOcr 识别验证码时发生错误: {e}")
-        return None
+    recognized_code = ocr_engine.recognize(image_bytes)
+    if recognized_code:
+        print(f"[{time.strftime('%H:%M:%S')}] DdddOcr 识别成功，结果: {recognized_code}")
+        return recognized_code
+    return None
 
 # --- 验证码获取函数 ---
-def get_captcha_code(session, max_retries=5):
+def get_captcha_code(session, max_retries=5, deadline=None):
     for attempt in range(1, max_retries + 1):
         print(f"[{time.strftime('%H:%M:%S')}] 尝试识别验证码 (第 {attempt} 次)...")
         try:
-            captcha_response = session.get(CAPTCHA_URL, stream=True, timeout=5)
+            captcha_response = session.get(CAPTCHA_URL, stream=True, timeout=deadline.timeout(5) if deadline else 5)
             captcha_response.raise_for_status()
             image_bytes = captcha_response.content
             recognized_code = recognize_captcha_with_ddddocr(image_bytes)
@@ -106,35 +115,40 @@ def get_captcha_code(session, max_retries=5):
                 return recognized_code
         except requests.exceptions.RequestException as e:
             print(f"[{time.strftime('%H:%M:%S')}] 下载验证码失败: {e}")
-        if attempt < max_retries:
-            time.sleep(random.uniform(1, 2))
+        if attempt < max_retries and not wait_before_retry(CAPTCHA_BACKOFF, attempt, deadline):
+            break
     print(f"[{time.strftime('%H:%M:%S')}] 验证码识别最终失败。")
     return None
 
 # --- 登录函数 ---
-def login(session, username, raw_password, dynamic_token, max_retries=5):
+def login(session, username, raw_password, dynamic_token, max_retries=5, deadline=None):
     hashed_password_for_login = get_hashed_password_for_login(raw_password)
+    deadline = deadline or Deadline(LOGIN_BUDGET)
     for attempt in range(1, max_retries + 1):
         print(f"\n[{time.strftime('%H:%M:%S')}] 尝试登录 (第 {attempt} 次)...")
-        captcha_code = get_captcha_code(session)
+        captcha_code = get_captcha_code(session, deadline=deadline)
         if not captcha_code: return False
         login_data = {"tokenValue": dynamic_token, "j_username": username, "j_password": hashed_password_for_login, "j_captcha": captcha_code}
         try:
-            response = session.post(LOGIN_URL, data=login_data, allow_redirects=False, timeout=10)
+            response = session.post(LOGIN_URL, data=login_data, allow_redirects=False, timeout=deadline.timeout(10))
             response.raise_for_status()
             if response.status_code == 302 and "/index" in response.headers.get("location", ""):
+                ocr_engine.record_outcome(True)
                 print(f"[{time.strftime('%H:%M:%S')}] 登录成功！")
                 return True
             else:
+                if "验证码输入错误" in response.text: ocr_engine.record_outcome(False)
+                elif "用户名或密码错误" in response.text: ocr_engine.record_outcome(True)
                 error_message = "验证码或密码错误" if "验证码输入错误" in response.text or "用户名或密码错误" in response.text else "未知登录错误"
                 print(f"[{time.strftime('%H:%M:%S')}] 登录失败: {error_message}")
                 if "验证码" in error_message:
                     new_token = get_dynamic_token(session)
                     if new_token: dynamic_token = new_token
-                time.sleep(random.uniform(2, 4))
         except requests.exceptions.RequestException as e:
             print(f"[{time.strftime('%H:%M:%S')}] 登录请求失败: {e}")
-            time.sleep(random.uniform(2, 4))
+        if attempt < max_retries and not wait_before_retry(LOGIN_BACKOFF, attempt, deadline):
+            print(f"[{time.strftime('%H:%M:%S')}] 登录时间预算已用完。")
+            break
     print(f"[{time.strftime('%H:%M:%S')}] 登录最终失败。")
     return False
 
@@ -144,10 +158,8 @@ def get_dynamic_token(session):
     try:
         response = session.get(LOGIN_PAGE_URL, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        token_input = soup.find('input', {'name': 'tokenValue'})
-        if token_input and 'value' in token_input.attrs:
-            token = token_input['value']
+        token = extract_token(response.text)
+        if token:
             print(f"[{time.strftime('%H:%M:%S')}] 成功获取动态tokenValue: {token}")
             return token
         return None
@@ -156,66 +168,162 @@ def get_dynamic_token(session):
         return None
 
 # --- 获取用户姓名函数 ---
-def get_user_name(session_obj):
+def get_user_name(session_obj, use_cache=True):
+    state = get_session_state(session_obj)
+    if use_cache and state.get("user_name"): return state["user_name"]
     try:
         print(f"[{time.strftime('%H:%M:%S')}] 尝试获取用户姓名...")
         response = session_obj.get(USER_INDEX_PAGE_URL, timeout=10)
         response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        user_info_span = soup.find('span', class_='user-info')
-        if user_info_span:
-            user_name = user_info_span.get_text(strip=True).replace("欢迎您，", "").strip()
-            if user_name:
-                print(f"[{time.strftime('%H:%M:%S')}] 成功获取用户姓名: {user_name}")
-                return user_name
+        user_name = extract_user_name(response.text)
+        if user_name:
+            print(f"[{time.strftime('%H:%M:%S')}] 成功获取用户姓名: {user_name}")
+            state["user_name"] = user_name
+            return user_name
     except Exception as e:
         print(f"[{time.strftime('%H:%M:%S')}] 解析用户姓名失败: {e}")
     return "同学"
 
 # --- 获取学业信息函数 ---
-def fetch_academic_info(session_obj, max_retries=5, delay=2):
+def parse_academic_info(data):
+    """从 academicInfo 接口的 JSON 中取出 GPA 和本学期课程数；数据不完整时返回 None"""
+    if not isinstance(data, list) or not data: return None
+    info = data[0]
+    gpa = info.get("gpa")
+    course_count = info.get("courseNum_bxqyxd")
+    if gpa is None or course_count is None: return None
+    return {"gpa": str(gpa), "course_count": int(course_count)}
+
+def _remember_academic_info(session_obj, result):
+    get_session_state(session_obj)["academic_info"] = (time.monotonic(), result)
+
+def _recent_academic_info(session_obj):
+    cached = get_session_state(session_obj).get("academic_info")
+    if cached and time.monotonic() - cached[0] < SESSION_ALIVE_TTL: return dict(cached[1])
+    return None
+
+def fetch_academic_info(session_obj, max_retries=5, deadline=None):
+    recent = _recent_academic_info(session_obj)
+    if recent: return recent
+    deadline = deadline or Deadline(ACADEMIC_INFO_BUDGET)
     print(f"[{time.strftime('%H:%M:%S')}] 尝试从API {ACADEMIC_INFO_URL} 获取学业信息...")
     for attempt in range(max_retries):
         try:
-            response = session_obj.get(ACADEMIC_INFO_URL, timeout=10)
+            response = session_obj.get(ACADEMIC_INFO_URL, timeout=deadline.timeout(10))
             response.raise_for_status()
             data = response.json()
-            if isinstance(data, list) and data:
-                info = data[0]
-                gpa = info.get("gpa")
-                course_count = info.get("courseNum_bxqyxd")
-                if gpa is not None and course_count is not None:
-                    result = {"gpa": str(gpa), "course_count": int(course_count)}
-                    print(f"[{time.strftime('%H:%M:%S')}] 成功获取学业信息: {result}")
-                    return result
-                else:
-                    print(f"[{time.strftime('%H:%M:%S')}] API返回数据不完整。将在 {delay} 秒后重试...")
+            result = parse_academic_info(data)
+            if result:
+                print(f"[{time.strftime('%H:%M:%S')}] 成功获取学业信息: {result}")
+                _remember_academic_info(session_obj, result)
+                return result
+            elif isinstance(data, list) and data:
+                print(f"[{time.strftime('%H:%M:%S')}] API返回数据不完整，稍后重试...")
             else:
-                print(f"[{time.strftime('%H:%M:%S')}] API返回数据格式不正确或为空。将在 {delay} 秒后重试...")
+                print(f"[{time.strftime('%H:%M:%S')}] API返回数据格式不正确或为空，稍后重试...")
         except (requests.exceptions.RequestException, json.JSONDecodeError, IndexError, KeyError) as e:
             print(f"[{time.strftime('%H:%M:%S')}] 获取或解析学业信息失败: {e}")
-        if attempt < max_retries - 1:
-            time.sleep(delay)
-    print(f"[{time.strftime('%H:%M:%S')}] 达到最大重试次数，未能获取到有效的学业信息。")
+        if attempt < max_retries - 1 and not wait_before_retry(ACADEMIC_INFO_BACKOFF, attempt + 1, deadline):
+            break
+    print(f"[{time.strftime('%H:%M:%S')}] 达到最大重试次数或时间预算，未能获取到有效的学业信息。")
     return {"gpa": "N/A", "course_count": 0}
 
+# --- 会话有效性探测 ---
+def _probe_academic_info(session_obj):
+    """用轻量的 academicInfo JSON 接口探测会话；会话失效时教务系统会重定向到登录页"""
+    response = session_obj.get(ACADEMIC_INFO_URL, timeout=5, allow_redirects=False)
+    if response.status_code != 200: return False
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    result = parse_academic_info(data)
+    if result: _remember_academic_info(session_obj, result)
+    return isinstance(data, list)
+
+def check_session_alive(session_obj):
+    """判断上游会话是否仍然有效。
+
+    最近一次探测成功后的 SESSION_ALIVE_TTL 秒内直接返回 True；已知用户姓名时只请求
+    academicInfo 接口（结果同时供 fetch_academic_info 复用），否则抓取一次首页，
+    顺带缓存用户姓名，后续 get_user_name 不必再次请求首页。
+    """
+    state = get_session_state(session_obj)
+    alive_at = state.get("alive_at")
+    if alive_at and time.monotonic() - alive_at < SESSION_ALIVE_TTL: return True
+    try:
+        if state.get("user_name"):
+            alive = _probe_academic_info(session_obj)
+        else:
+            alive = get_user_name(session_obj, use_cache=False) != "同学"
+    except requests.exceptions.RequestException as e:
+        print(f"[{time.strftime('%H:%M:%S')}] 会话探测请求失败: {e}")
+        alive = False
+    if alive:
+        state["alive_at"] = time.monotonic()
+    else:
+        for key in ("alive_at", "user_name", "academic_info"): state.pop(key, None)
+    print(f"[{time.strftime('%H:%M:%S')}] 会话探测结果: {'有效' if alive else '已失效'}")
+    return alive
+
+# --- 动态 scoreQuery 路径段：按上游会话缓存，失效时才重新抓取页面 ---
+def _discover_score_query_segment(session, index_page_url, endpoint):
+    response_index_page = session.get(index_page_url, timeout=15)
+    response_index_page.raise_for_status()
+    match = re.search(rf'scoreQuery/(.*?)/{endpoint}', response_index_page.text)
+    return match.group(1) if match else None
+
+def _request_score_query_api(session, segment, endpoint, headers, allow_redirects=True):
+    """调用动态成绩API；返回 None 表示路径段可能已失效（404、重定向或无法解析）"""
+    api_url = SCORE_QUERY_API_URL.format(segment=segment, endpoint=endpoint)
+    response = session.get(api_url, headers=headers, timeout=15, allow_redirects=allow_redirects)
+    if response.status_code == 404 or response.is_redirect: return None
+    response.raise_for_status()
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+def fetch_score_query_json(session, index_page_url, endpoint):
+    segments = get_session_state(session).setdefault("score_query_segments", {})
+    headers = { "Referer": index_page_url, "X-Requested-With": "XMLHttpRequest" }
+    cached_segment = segments.get(endpoint)
+    if cached_segment:
+        data = _request_score_query_api(session, cached_segment, endpoint, headers, allow_redirects=False)
+        if data is not None: return data
+        print(f"[{time.strftime('%H:%M:%S')}] 缓存的动态API路径段已失效，重新获取...")
+        segments.pop(endpoint, None)
+    segment = _discover_score_query_segment(session, index_page_url, endpoint)
+    if not segment:
+        print(f"[{time.strftime('%H:%M:%S')}] 未能从页面获取 {endpoint} 的动态API路径段。")
+        return None
+    segments[endpoint] = segment
+    print(f"[{time.strftime('%H:%M:%S')}] 构建动态成绩API URL: {SCORE_QUERY_API_URL.format(segment=segment, endpoint=endpoint)}")
+    return _request_score_query_api(session, segment, endpoint, headers)
+
+# --- 成绩数据中的课程列表 ---
+def iter_course_lists(grades_data):
+    """遍历成绩接口返回数据中的课程列表，产出 (列表标识, 课程列表)。
+
+    兼容历史成绩接口的 {"lnList": [{"cjList": [...]}]} 结构，以及当前学期接口
+    常见的 [{"list": [...]}] / {"list": [...]} 结构。
+    """
+    if isinstance(grades_data, dict) and 'lnList' in grades_data:
+        for index, course_group in enumerate(grades_data.get('lnList') or []):
+            yield f"lnList[{index}]", course_group.get('cjList') or []
+    elif isinstance(grades_data, dict) and isinstance(grades_data.get('list'), list):
+        yield "list", grades_data['list']
+    elif isinstance(grades_data, list):
+        for index, item in enumerate(grades_data):
+            if isinstance(item, dict) and isinstance(item.get('list'), list):
+                yield f"[{index}].list", item['list']
+
 # --- 获取所有学期成绩数据 ---
 def fetch_all_grades(session):
-    print(f"[{time.strftime('%H:%M:%S')}] 正在访问历史成绩页面以获取动态API路径...")
+    print(f"[{time.strftime('%H:%M:%S')}] 正在获取全部历史成绩...")
     try:
-        response_index_page = session.get(ALL_GRADES_INDEX_PAGE_URL, timeout=15)
-        response_index_page.raise_for_status()
-        match = re.search(r'scoreQuery/(.*?)/coursePropertyScores/callback', response_index_page.text)
-        if not match:
-            print(f"[{time.strftime('%H:%M:%S')}] 未能从历史成绩页面获取动态API路径段。")
-            return None
-        dynamic_path_segment = match.group(1)
-        dynamic_grades_api_url = f"{BASE_URL}/student/integratedQuery/scoreQuery/{dynamic_path_segment}/coursePropertyScores/callback"
-        print(f"[{time.strftime('%H:%M:%S')}] 构建动态历史成绩API URL: {dynamic_grades_api_url}")
-        headers = { "Referer": ALL_GRADES_INDEX_PAGE_URL, "X-Requested-With": "XMLHttpRequest" }
-        response_grades_data = session.get(dynamic_grades_api_url, headers=headers, timeout=15)
-        response_grades_data.raise_for_status()
-        grades_data = response_grades_data.json()
+        grades_data = fetch_score_query_json(session, ALL_GRADES_INDEX_PAGE_URL, ALL_GRADES_ENDPOINT)
+        if grades_data is None: return None
         print(f"[{time.strftime('%H:%M:%S')}] 全部历史成绩获取成功。")
         return grades_data
     except Exception as e:
@@ -224,21 +332,10 @@ def fetch_all_grades(session):
 
 # --- 获取当前学期成绩数据函数 ---
 def fetch_grades(session):
-    print(f"[{time.strftime('%H:%M:%S')}] 正在访问当前学期成绩页面以获取动态API路径...")
+    print(f"[{time.strftime('%H:%M:%S')}] 正在获取当前学期成绩...")
     try:
-        response_grades_page = session.get(GRADES_INDEX_PAGE_URL, timeout=15)
-        response_grades_page.raise_for_status()
-        match = re.search(r'scoreQuery/(.*?)/thisTermScores/data', response_grades_page.text)
-        if not match:
-            print(f"[{time.strftime('%H:%M:%S')}] 未能获取当前学期动态API路径段。")
-            return None
-        dynamic_path_segment = match.group(1)
-        dynamic_grades_api_url = f"{BASE_URL}/student/integratedQuery/scoreQuery/{dynamic_path_segment}/thisTermScores/data"
-        print(f"[{time.strftime('%H:%M:%S')}] 构建动态当前学期成绩API URL: {dynamic_grades_api_url}")
-        headers = { "Referer": GRADES_INDEX_PAGE_URL, "X-Requested-With": "XMLHttpRequest" }
-        response_grades_data = session.get(dynamic_grades_api_url, headers=headers, timeout=15)
-        response_grades_data.raise_for_status()
-        grades_data = response_grades_data.json()
+        grades_data = fetch_score_query_json(session, GRADES_INDEX_PAGE_URL, CURRENT_TERM_ENDPOINT)
+        if grades_data is None: return None
         print(f"[{time.strftime('%H:%M:%S')}] 当前学期成绩获取成功。")
         return grades_data
     except Exception as e:
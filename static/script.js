@@ -5,84 +5,177 @@ $(document).ready(function() {
     const $allGradesContainer = $('#all-grades-container');
     const $loadingSpinner = $('#loading-spinner'), $welcomeSection = $('#welcome-section');
     const $userAvatar = $('#userAvatar'), $userNameDisplay = $('#userNameDisplay'), $userIdDisplay = $('#userIdDisplay');
-    const $currentTermPassed = $('#currentTermPassed'), $currentTermProgress = $('#currentTermProgress'), $overallGpaValue = $('#overallGpaValue');
+    const $currentTermPassed = $('#currentTermPassed'), $currentTermProgress = $('#currentTermProgress'), $overallGpaValue = $('#overallGpaValue'), $overallGpaSource = $('#overallGpaSource');
+
+    // --- 成绩数据状态：保存上次完整数据及其版本号，用于 ETag / 增量刷新 ---
+    const GRADES_STORAGE_KEY = 'gradesPayload';
+    let gradesState = null;
+    try { gradesState = JSON.parse(localStorage.getItem(GRADES_STORAGE_KEY)); } catch (e) { gradesState = null; }
+    // Service Worker 另存一份上次的成绩，离线或网络慢时直接用它响应成绩接口
+    const postToServiceWorker = (message) => {
+        if ('serviceWorker' in navigator && navigator.serviceWorker.controller) navigator.serviceWorker.controller.postMessage(message);
+    };
+    const saveGradesState = (payload) => {
+        gradesState = payload;
+        try { localStorage.setItem(GRADES_STORAGE_KEY, JSON.stringify(payload)); } catch (e) { /* 存储空间不足时仅保留内存中的状态 */ }
+        postToServiceWorker({ type: 'store-grades', payload });
+    };
+    const clearGradesState = () => {
+        gradesState = null;
+        localStorage.removeItem(GRADES_STORAGE_KEY);
+        postToServiceWorker({ type: 'clear-grades' });
+    };
+
+    // 与服务端 grades_diff.course_keys 相同的课程标识规则
+    const courseKeys = (list) => {
+        const seen = {};
+        return list.map((course) => {
+            const base = `${course.courseName || ''}|${course.examTypeName || ''}`;
+            seen[base] = (seen[base] || 0) + 1;
+            return `${base}#${seen[base]}`;
+        });
+    };
+
+    const mergeGradesDiff = (base, diff) => {
+        const oldTerms = {};
+        base.all_grades.forEach((term) => { oldTerms[term.termName] = term; });
+        const all_grades = diff.terms.map((term) => {
+            const list = (oldTerms[term.termName]?.list || []).slice();
+            const change = diff.changes[term.termName];
+            if (!change) return { ...term, list };
+            const keys = courseKeys(list), positions = {};
+            keys.forEach((key, index) => { positions[key] = index; });
+            change.upserts.forEach(({ key, ...course }) => {
+                if (key in positions) { list[positions[key]] = course; }
+                else { positions[key] = list.length; list.push(course); keys.push(key); }
+            });
+            const removed = new Set(change.removed);
+            return { ...term, list: list.filter((_, index) => !removed.has(keys[index])) };
+        });
+        const { mode, since, terms, changes, ...rest } = diff;
+        return { ...rest, all_grades };
+    };
+
+    // 带上 If-None-Match 和 since 请求成绩接口：304 直接复用本地数据，增量结果合并进本地数据
+    const requestGrades = (url, { success, error, complete }) => {
+        const base = gradesState && gradesState.version ? gradesState : null;
+        $.ajax({
+            url: base ? `${url}?since=${encodeURIComponent(base.version)}` : url, method: 'POST',
+            headers: base ? { 'If-None-Match': `"${base.version}"` } : {},
+            success: (res, _status, xhr) => {
+                if (xhr.status === 304) { success(base, false); return; }
+                const payload = res && res.mode === 'diff' ? mergeGradesDiff(base, res) : res;
+                if (!payload || !payload.success) return;
+                saveGradesState(payload);
+                success(payload, true);
+            },
+            error, complete
+        });
+    };
 
     // --- 核心渲染函数 ---
-    const displayAllGrades = (allGrades) => {
-        $allGradesContainer.empty();
-        if (!allGrades || allGrades.length === 0) {
-            $allGradesContainer.append('<p>暂无成绩数据。</p>'); return;
-        }
+    // 每个学期的卡片拼成一个字符串一次插入；折叠的学期先不生成课程列表，首次展开时再生成
+    const renderedTerms = [];
 
-        allGrades.forEach((termData, termIndex) => {
-            const termId = `term-${termIndex}`;
-            const isCurrentClass = termData.isCurrent ? 'is-current' : '';
-            // [FINAL POLISH] Added wrapper for chevron and staggered animation delay
-            const termCardHtml = `
-                <div class="term-card ${isCurrentClass}" id="${termId}" style="animation-delay: ${termIndex * 70}ms">
-                    <div class="term-header">
-                        <div class="term-header-info">
-                            ${termData.isCurrent ? '<span class="term-tag current">当前学期</span>' : ''}
-                            ${termData.termLabel ? `<span class="term-tag">${termData.termLabel}</span>` : ''}
-                            <span class="term-name">${termData.termName}</span>
-                        </div>
-                        <div class="term-chevron-wrapper">
-                            <i class="icon chevron-right"></i>
-                        </div>
+    // 与服务端 grade_analytics.FAILING_LEVELS 一致：等级制课程没有数值分数，按等级显示和判断是否通过
+    const FAILING_LEVELS = ['不及格', '不合格', '缺考'];
+    const gradeItemHtml = (grade) => {
+        const hasLevel = !grade.isValidScore && grade.levelName && grade.levelName !== 'N/A';
+        const displayScore = grade.isValidScore ? grade.courseScore : (hasLevel ? grade.levelName : '未公布');
+        const isPassed = grade.isValidScore ? parseFloat(grade.courseScore) >= 60 : hasLevel && !FAILING_LEVELS.includes(grade.levelName);
+        const cardClass = grade.isValidScore || hasLevel ? (isPassed ? 'passed' : 'failed') : 'not-announced';
+        return `
+            <div class="grade-item ${cardClass}">
+                <div class="card-main">
+                    <div class="card-main-info">
+                        <p class="course-name">${grade.courseName || 'N/A'}</p>
+                        <p class="course-details-inline">学分: ${grade.credit || 'N/A'}</p>
                     </div>
-                    <div class="term-content">
-                        <div class="grades-list"></div>
+                    <div class="card-main-action">
+                        <span class="score-value">${displayScore}</span>
                     </div>
                 </div>
-            `;
-            $allGradesContainer.append(termCardHtml);
-
-            const $gradesList = $(`#${termId} .grades-list`);
-            if (termData.list && termData.list.length > 0) {
-                termData.list.forEach((grade) => {
-                    const displayScore = grade.isValidScore ? grade.courseScore : '未公布';
-                    const isPassed = grade.isValidScore && parseFloat(grade.courseScore) >= 60;
-                    const cardClass = grade.isValidScore ? (isPassed ? 'passed' : 'failed') : 'not-announced';
-                    const gradeItemHtml = `
-                        <div class="grade-item ${cardClass}">
-                            <div class="card-main">
-                                <div class="card-main-info">
-                                    <p class="course-name">${grade.courseName || 'N/A'}</p>
-                                    <p class="course-details-inline">学分: ${grade.credit || 'N/A'}</p>
-                                </div>
-                                <div class="card-main-action">
-                                    <span class="score-value">${displayScore}</span>
-                                </div>
-                            </div>
-                            <div class="card-details-extra">
-                                <div>
-                                    <div class="detail-row"><span class="detail-label">绩点</span><span class="detail-value">${grade.gradePoint || 'N/A'}</span></div>
-                                    <div class="detail-row"><span class="detail-label">等级</span><span class="detail-value">${grade.levelName || 'N/A'}</span></div>
-                                    <div class="detail-row"><span class="detail-label">考试类型</span><span class="detail-value">${grade.examTypeName || 'N/A'}</span></div>
-                                    <div class="detail-row"><span class="detail-label">录入时间</span><span class="detail-value">${grade.operatetime || 'N/A'}</span></div>
-                                </div>
-                            </div>
-                        </div>`;
-                    $gradesList.append(gradeItemHtml);
-                });
-            }
-        });
-        $allGradesContainer.find('.term-card.is-current').addClass('is-expanded');
+                <div class="card-details-extra">
+                    <div>
+                        <div class="detail-row"><span class="detail-label">绩点</span><span class="detail-value">${grade.gradePoint || 'N/A'}</span></div>
+                        <div class="detail-row"><span class="detail-label">等级</span><span class="detail-value">${grade.levelName || 'N/A'}</span></div>
+                        <div class="detail-row"><span class="detail-label">考试类型</span><span class="detail-value">${grade.examTypeName || 'N/A'}</span></div>
+                        <div class="detail-row"><span class="detail-label">录入时间</span><span class="detail-value">${grade.operatetime || 'N/A'}</span></div>
+                    </div>
+                </div>
+            </div>`;
     };
 
-    const handleLoginSuccess = (response) => {
-        const { user_name, username, all_grades, overall_gpa, current_stats } = response;
-        $userAvatar.text(user_name ? user_name.charAt(0) : 'Hi');
-        $userNameDisplay.text(user_name || '同学');
-        $userIdDisplay.text(`学号: ${username || '未知'}`);
-        $('#welcomeMessage').text(`${user_name}，欢迎回来`);
+    const gradesListHtml = (termData) => (termData.list || []).map(gradeItemHtml).join('');
 
+    const termCardHtml = (termData, termIndex) => {
+        renderedTerms[termIndex] = termData;
+        const stateClass = termData.isCurrent ? 'is-current is-expanded' : '';
+        // [FINAL POLISH] Added wrapper for chevron and staggered animation delay
+        return `
+            <div class="term-card ${stateClass}" id="term-${termIndex}" data-term-index="${termIndex}" style="animation-delay: ${termIndex * 70}ms">
+                <div class="term-header">
+                    <div class="term-header-info">
+                        ${termData.isCurrent ? '<span class="term-tag current">当前学期</span>' : ''}
+                        ${termData.termLabel ? `<span class="term-tag">${termData.termLabel}</span>` : ''}
+                        <span class="term-name">${termData.termName}</span>
+                        ${termData.gpa && termData.gpa !== 'N/A' ? `<span class="term-gpa">绩点 ${termData.gpa}</span>` : ''}
+                    </div>
+                    <div class="term-chevron-wrapper">
+                        <i class="icon chevron-right"></i>
+                    </div>
+                </div>
+                <div class="term-content">
+                    <div class="grades-list">${termData.isCurrent ? gradesListHtml(termData) : ''}</div>
+                </div>
+            </div>
+        `;
+    };
+
+    // 首次展开折叠的学期时生成它的课程列表
+    const ensureGradesList = ($termCard) => {
+        const termIndex = $termCard.data('term-index');
+        const termData = renderedTerms[termIndex];
+        if (!termData || termData.isCurrent || $termCard.data('list-built')) return;
+        $termCard.data('list-built', true).find('.grades-list').html(gradesListHtml(termData));
+    };
+
+    // 流式加载时逐个学期追加
+    const appendTermCard = (termData, termIndex) => { $allGradesContainer.append(termCardHtml(termData, termIndex)); };
+
+    const displayAllGrades = (allGrades) => {
+        renderedTerms.length = 0;
+        if (!allGrades || allGrades.length === 0) {
+            $allGradesContainer.html('<p>暂无成绩数据。</p>'); return;
+        }
+        $allGradesContainer.html(allGrades.map(termCardHtml).join(''));
+    };
+
+    // 官方 GPA 暂不可用时展示按已公布成绩估算的 GPA，并在数值下方注明来源
+    const GPA_SOURCE_LABELS = { official: '教务系统', local: '按已公布成绩估算' };
+    const displayStats = ({ current_stats, overall_gpa, gpa_source }) => {
         $currentTermPassed.text(current_stats.passed);
         $currentTermProgress.text(`${current_stats.announced} / ${current_stats.total}`);
         $overallGpaValue.text(overall_gpa || "N/A");
+        $overallGpaSource.text(overall_gpa && overall_gpa !== "N/A" ? (GPA_SOURCE_LABELS[gpa_source] || '') : '');
+    };
+
+    const displayProfile = (user_name, username) => {
+        $userAvatar.text(user_name ? user_name.charAt(0) : 'Hi');
+        $userNameDisplay.text(user_name || '同学');
+        $userIdDisplay.text(`学号: ${username || '未知'}`);
+        $('#welcomeMessage').text(`${user_name}，欢迎回来`);
+    };
 
+    const handleLoginSuccess = (response) => {
+        const { user_name, username, all_grades } = response;
+        displayProfile(user_name, username);
+        displayStats(response);
         displayAllGrades(all_grades);
-        
+        playEnterAnimation();
+    };
+
+    const playEnterAnimation = () => {
         $loginSection.hide();
         $loadingSpinner.removeClass('animate-exit').addClass('animate-enter');
         
@@ -96,20 +189,103 @@ $(document).ready(function() {
         }, 500);
     };
 
+    const showLoginForm = (status, res) => {
+        $loadingSpinner.addClass('animate-exit');
+        $loginSection.show();
+        if (status !== 401) { $('#loginMessage').text('无法连接服务器').addClass('error').css('opacity', 1); } 
+        else {
+            clearGradesState();
+            if (res && res.username_saved) $('#username').val(res.username_saved);
+        }
+    };
+
+    // --- 流式加载：逐行读取 NDJSON，姓名、统计、各学期到达即渲染 ---
+    const readNdjson = async (response, onEvent) => {
+        const reader = response.body.getReader(), decoder = new TextDecoder();
+        let buffer = '';
+        for (;;) {
+            const { done, value } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            let newline;
+            while ((newline = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (line) onEvent(JSON.parse(line));
+            }
+            if (done) return;
+        }
+    };
+
+    const streamGrades = async () => {
+        // 已有本地数据时带上版本号：服务端命中缓存会返回 304 或 JSON 增量，而不是重发全部学期
+        const base = gradesState && gradesState.version ? gradesState : null;
+        const url = base ? `/api/stream/auto_login_and_grades?since=${encodeURIComponent(base.version)}` : '/api/stream/auto_login_and_grades';
+        const response = await fetch(url, {
+            method: 'POST', credentials: 'same-origin', headers: base ? { 'If-None-Match': `"${base.version}"` } : {}
+        });
+        if (response.status === 304) { handleLoginSuccess(base); return; }
+        if (!response.ok) {
+            const res = await response.json().catch(() => null);
+            showLoginForm(response.status, res);
+            return;
+        }
+        if ((response.headers.get('Content-Type') || '').includes('application/json')) {
+            const res = await response.json();
+            const payload = res.mode === 'diff' ? mergeGradesDiff(base, res) : res;
+            saveGradesState(payload);
+            handleLoginSuccess(payload);
+            return;
+        }
+        const payload = { success: true, all_grades: [] };
+        await readNdjson(response, (event) => {
+            if (event.type === 'user') {
+                Object.assign(payload, { user_name: event.user_name, username: event.username });
+                displayProfile(event.user_name, event.username);
+                renderedTerms.length = 0;
+                $allGradesContainer.empty();
+                playEnterAnimation();
+            } else if (event.type === 'stats') {
+                const { type, ...stats } = event;
+                Object.assign(payload, stats);
+                displayStats(payload);
+            } else if (event.type === 'term') {
+                payload.all_grades[event.index] = event.term;
+                appendTermCard(event.term, event.index);
+            } else if (event.type === 'done') {
+                payload.version = event.version;
+                saveGradesState(payload);
+            } else if (event.type === 'error') {
+                $allGradesContainer.html(`<p>${event.message}</p>`);
+            }
+        });
+    };
+
+    // Service Worker 先返回缓存的成绩，后台向服务器确认后再通知这里更新页面
+    const listenServiceWorker = () => {
+        if (!('serviceWorker' in navigator)) return;
+        navigator.serviceWorker.addEventListener('message', ({ data }) => {
+            if (!data || !gradesState) return;
+            if (data.type === 'session-expired') { clearGradesState(); window.location.reload(); return; }
+            const payload = data.type === 'grades-diff' ? (data.diff.since === gradesState.version ? mergeGradesDiff(gradesState, data.diff) : null) : data.type === 'grades-updated' ? data.payload : null;
+            if (!payload || payload.version === gradesState.version) return;
+            saveGradesState(payload);
+            displayStats(payload);
+            displayAllGrades(payload.all_grades);
+        });
+    };
+
     const initApp = () => {
         $loadingSpinner.addClass('animate-enter');
-        $.ajax({
-            url: '/api/auto_login_and_grades', method: 'POST',
-            success: (res) => { if (res.success) handleLoginSuccess(res); },
-            error: (xhr) => {
-                $loadingSpinner.addClass('animate-exit');
-                $loginSection.show();
-                if (xhr.status !== 401) { $('#loginMessage').text('无法连接服务器').addClass('error').css('opacity', 1); } 
-                else {
-                    const res = xhr.responseJSON;
-                    if (res && res.username_saved) $('#username').val(res.username_saved);
-                }
-            }
+        listenServiceWorker();
+        // 有上次的数据时走 JSON 接口，由 Service Worker 立即用缓存响应；首次加载才走流式接口
+        const cachedBySw = gradesState && 'serviceWorker' in navigator && navigator.serviceWorker.controller;
+        if (!cachedBySw && window.fetch && window.ReadableStream && window.TextDecoder) {
+            streamGrades().catch(() => showLoginForm(0));
+            return;
+        }
+        requestGrades('/api/auto_login_and_grades', {
+            success: (payload) => handleLoginSuccess(payload),
+            error: (xhr) => showLoginForm(xhr.status, xhr.responseJSON)
         });
     };
 
@@ -117,16 +293,53 @@ $(document).ready(function() {
         const username = $('#username').val().trim();
         const password = $('#password').val();
         if (!username || !password) { return; }
+        const $btn = $(this).prop('disabled', true);
+        const showLoginError = (xhr) => {
+            $btn.prop('disabled', false);
+            $('#loginMessage').text(xhr.responseJSON?.message || '请求失败').addClass('error').css('opacity', 1);
+        };
+        // 登录在服务端后台任务中进行（含验证码重试），这里轮询任务状态直到完成
+        const pollLoginJob = (jobId) => {
+            $.ajax({
+                url: `/api/login_jobs/${jobId}`, method: 'GET',
+                success: (res, _status, xhr) => {
+                    if (xhr.status === 202) { setTimeout(() => pollLoginJob(jobId), 700); return; }
+                    $btn.prop('disabled', false);
+                    if (res.success) { saveGradesState(res); handleLoginSuccess(res); }
+                },
+                error: showLoginError
+            });
+        };
         $.ajax({
-            url: '/api/manual_login_and_get_grades', method: 'POST', contentType: 'application/json',
+            url: '/api/login_jobs', method: 'POST', contentType: 'application/json',
             data: JSON.stringify({ username, password, save_info: $('#saveLoginInfo').is(':checked') }),
-            success: (res) => { if (res.success) handleLoginSuccess(res); },
-            error: (xhr) => { $('#loginMessage').text(xhr.responseJSON?.message || '请求失败').addClass('error').css('opacity', 1); }
+            success: (res) => { if (res.success) setTimeout(() => pollLoginJob(res.job_id), 500); },
+            error: showLoginError
         });
     });
 
-    $('#logoutBtn').on('click', () => { $.post('/api/logout', () => window.location.reload()); });
-    $gradesSection.on('click', '.term-header', function() { $(this).closest('.term-card').toggleClass('is-expanded'); });
+    // 只刷新本学期成绩（服务端合并进已有历史），比重新拉取全部历史轻量得多
+    $('#refreshBtn').on('click', function() {
+        const $btn = $(this);
+        if ($btn.hasClass('is-loading')) return;
+        $btn.addClass('is-loading');
+        requestGrades('/api/refresh_current_term', {
+            success: (payload, changed) => {
+                if (!changed) return;
+                displayStats(payload);
+                displayAllGrades(payload.all_grades);
+            },
+            error: (xhr) => { if (xhr.status === 401) window.location.reload(); },
+            complete: () => $btn.removeClass('is-loading')
+        });
+    });
+
+    $('#logoutBtn').on('click', () => { clearGradesState(); $.post('/api/logout', () => window.location.reload()); });
+    $gradesSection.on('click', '.term-header', function() {
+        const $termCard = $(this).closest('.term-card');
+        ensureGradesList($termCard);
+        $termCard.toggleClass('is-expanded');
+    });
     $gradesSection.on('click', '.grade-item', function(e) { e.stopPropagation(); $(this).toggleClass('expanded'); });
 
     initApp();
@@ -1,3 +1,158 @@
+// service-worker.js
+// 由 Flask 的 /service-worker.js 路由提供，__STATIC_VERSION__ 会被替换为当前静态资源版本
+const STATIC_VERSION = '__STATIC_VERSION__';
+const SHELL_CACHE = `grades-shell-${STATIC_VERSION}`;
+const DATA_CACHE = 'grades-data-v1';
+const LAST_GRADES_KEY = '/__last_grades__';
+const GRADES_URL = '/api/auto_login_and_grades';
+const STREAM_GRADES_URL = '/api/stream/auto_login_and_grades';
+
+const SHELL_URLS = [
+    '/',
+    `/static/style.css?v=${STATIC_VERSION}`,
+    `/static/script.js?v=${STATIC_VERSION}`,
+    `/static/manifest.json?v=${STATIC_VERSION}`,
+    '/static/icons/icon-192x192.png',
+    '/static/icons/icon-512x512.png',
+];
+const CDN_URLS = ['https://ajax.googleapis.com/ajax/libs/jquery/3.7.1/jquery.min.js'];
+
+// --- 安装：预缓存应用外壳 ---
+self.addEventListener('install', (event) => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(SHELL_CACHE);
+        await cache.addAll(SHELL_URLS);
+        // 第三方资源失败不影响安装
+        await Promise.all(CDN_URLS.map((url) => cache.add(new Request(url, { mode: 'no-cors' })).catch(() => {})));
+        await self.skipWaiting();
+    })());
+});
+
+// --- 激活：清理旧版本的外壳缓存 ---
+self.addEventListener('activate', (event) => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names.filter((name) => name.startsWith('grades-shell-') && name !== SHELL_CACHE).map((name) => caches.delete(name)));
+        await self.clients.claim();
+    })());
+});
+
+// --- 上次的成绩数据 ---
+const readLastGrades = async () => {
+    const response = await (await caches.open(DATA_CACHE)).match(LAST_GRADES_KEY);
+    return response ? response.json() : null;
+};
+const storeLastGrades = async (payload) => {
+    const cache = await caches.open(DATA_CACHE);
+    await cache.put(LAST_GRADES_KEY, new Response(JSON.stringify(payload), { headers: { 'Content-Type': 'application/json' } }));
+};
+const clearLastGrades = async () => (await caches.open(DATA_CACHE)).delete(LAST_GRADES_KEY);
+
+const notifyClients = async (message) => {
+    const clients = await self.clients.matchAll({ type: 'window' });
+    clients.forEach((client) => client.postMessage(message));
+};
+
+const jsonResponse = (payload) => new Response(JSON.stringify(payload), {
+    headers: { 'Content-Type': 'application/json', 'X-Grades-Source': 'service-worker' }
+});
+
+// 离线时把缓存的成绩数据按流式接口的格式重新输出
+const ndjsonResponse = (payload) => {
+    const events = [
+        { type: 'user', user_name: payload.user_name, username: payload.username },
+        { type: 'stats', current_stats: payload.current_stats, overall_gpa: payload.overall_gpa, gpa_source: payload.gpa_source, official_gpa: payload.official_gpa, local_gpa: payload.local_gpa },
+        ...payload.all_grades.map((term, index) => ({ type: 'term', index, term })),
+        { type: 'done', version: payload.version },
+    ];
+    return new Response(events.map((event) => JSON.stringify(event)).join('\n') + '\n', {
+        headers: { 'Content-Type': 'application/x-ndjson', 'X-Grades-Source': 'service-worker' }
+    });
+};
+
+// 用网络结果更新缓存并通知页面：完整数据直接替换，增量交给页面合并，401 说明会话已失效
+const revalidateGrades = async (request) => {
+    const response = await fetch(request);
+    if (response.status === 401) {
+        await clearLastGrades();
+        await notifyClients({ type: 'session-expired' });
+    } else if (response.status === 200) {
+        const payload = await response.json();
+        if (payload.mode === 'diff') {
+            await notifyClients({ type: 'grades-diff', diff: payload });
+        } else if (payload.success) {
+            await storeLastGrades(payload);
+            await notifyClients({ type: 'grades-updated', payload });
+        }
+    }
+    return response;
+};
+
+// --- 成绩接口：stale-while-revalidate，先返回上次的数据，再在后台向服务器确认 ---
+const handleGradesRequest = async (event) => {
+    const cached = await readLastGrades();
+    if (!cached) {
+        const response = await fetch(event.request.clone());
+        if (response.status === 200) {
+            const payload = await response.clone().json();
+            if (payload.success && payload.mode !== 'diff') await storeLastGrades(payload);
+        }
+        return response;
+    }
+    event.waitUntil(revalidateGrades(event.request.clone()).catch(() => {}));
+    return jsonResponse(cached);
+};
+
+const handleStreamRequest = async (request) => {
+    try {
+        return await fetch(request);
+    } catch (error) {
+        const cached = await readLastGrades();
+        if (cached) return ndjsonResponse(cached);
+        throw error;
+    }
+};
+
+// --- 应用外壳和静态资源 ---
+const staleWhileRevalidate = async (event) => {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(event.request);
+    const network = fetch(event.request).then((response) => {
+        if (response.ok) cache.put(event.request, response.clone());
+        return response;
+    });
+    if (cached) {
+        event.waitUntil(network.catch(() => {}));
+        return cached;
+    }
+    return network;
+};
+
+const cacheFirst = async (request) => {
+    const cache = await caches.open(SHELL_CACHE);
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok || response.type === 'opaque') cache.put(request, response.clone());
+    return response;
+};
+
 self.addEventListener('fetch', (event) => {
-  event.respondWith(fetch(event.request));
+    const { request } = event;
+    const url = new URL(request.url);
+    if (url.origin === self.location.origin && request.method === 'POST') {
+        if (url.pathname === GRADES_URL) event.respondWith(handleGradesRequest(event));
+        else if (url.pathname === STREAM_GRADES_URL) event.respondWith(handleStreamRequest(request));
+        return;
+    }
+    if (request.method !== 'GET') return;
+    if (request.mode === 'navigate') { event.respondWith(staleWhileRevalidate(event)); return; }
+    if (url.origin !== self.location.origin || url.pathname.startsWith('/static/')) event.respondWith(cacheFirst(request));
+});
+
+// --- 页面通知：登录成功、增量合并后保存最新数据，退出登录时清除 ---
+self.addEventListener('message', (event) => {
+    const { type, payload } = event.data || {};
+    if (type === 'store-grades' && payload) event.waitUntil(storeLastGrades(payload));
+    else if (type === 'clear-grades') event.waitUntil(clearLastGrades());
 });
@@ -0,0 +1,73 @@
+# upstream_pool.py
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- 连接池配置 ---
+POOL_MAX_SESSIONS = int(os.environ.get("UPSTREAM_POOL_MAX_SESSIONS", "512"))
+POOL_IDLE_TIMEOUT = float(os.environ.get("UPSTREAM_POOL_IDLE_TIMEOUT", "1800"))  # 与 Flask 会话有效期一致
+POOL_CONNECTIONS = int(os.environ.get("UPSTREAM_POOL_CONNECTIONS", "4"))
+POOL_MAXSIZE = int(os.environ.get("UPSTREAM_POOL_MAXSIZE", "8"))
+
+def create_upstream_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, session_class=requests.Session):
+    """创建带有调优连接池的 requests.Session，保持长连接以复用 TCP/TLS"""
+    s = session_class()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers["Connection"] = "keep-alive"
+    return s
+
+class UpstreamSessionPool:
+    """服务端保存的上游会话注册表，按 Flask 会话 ID 索引，支持空闲淘汰和容量上限"""
+
+    def __init__(self, max_sessions=POOL_MAX_SESSIONS, idle_timeout=POOL_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()  # sid -> (last_used, requests.Session)
+        self._lock = threading.Lock()
+
+    def acquire(self, sid, cookies=None):
+        """取出已有的上游会话；若不存在（首次使用或已被淘汰）则用 Cookie 重建"""
+        with self._lock:
+            self._evict_idle_locked()
+            entry = self._sessions.get(sid) if sid else None
+            if entry is not None:
+                s = entry[1]
+                self._sessions[sid] = (time.monotonic(), s)
+                self._sessions.move_to_end(sid)
+                return s
+        s = create_upstream_session()
+        if cookies: s.cookies.update(cookies)
+        if sid: self.register(sid, s)
+        return s
+
+    def register(self, sid, s):
+        with self._lock:
+            old = self._sessions.pop(sid, None)
+            if old is not None and old[1] is not s: old[1].close()
+            self._sessions[sid] = (time.monotonic(), s)
+            while len(self._sessions) > self.max_sessions:
+                _, (_, evicted) = self._sessions.popitem(last=False)
+                evicted.close()
+
+    def discard(self, sid):
+        with self._lock:
+            entry = self._sessions.pop(sid, None)
+        if entry is not None: entry[1].close()
+
+    def _evict_idle_locked(self):
+        now = time.monotonic()
+        while self._sessions:
+            sid, (last_used, s) = next(iter(self._sessions.items()))
+            if now - last_used <= self.idle_timeout: break
+            del self._sessions[sid]
+            s.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)